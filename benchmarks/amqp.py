@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# Runs the persistent amqp output against a fake broker that refuses
+# connections and fails publishes now and then, and reports the batches,
+# publisher confirms, reconnections and the messages lost
+
+from collections import OrderedDict
+import random
+import time
+
+import pika
+
+from piot.outputs import amqp
+
+
+class FakeChannel:
+    def __init__(self, broker):
+        self._broker = broker
+        self.confirming = False
+
+    def confirm_delivery(self):
+        self.confirming = True
+
+    def exchange_declare(self, **kwargs):
+        pass
+
+    def queue_declare(self, **kwargs):
+        pass
+
+    def queue_bind(self, **kwargs):
+        pass
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        if random.random() < self._broker.failure_rate:
+            raise pika.exceptions.AMQPConnectionError("Fake publish failure")
+        self._broker.batches.append(body)
+        if self.confirming:
+            self._broker.confirms += 1
+
+
+class FakeConnection:
+    def __init__(self, broker):
+        self._broker = broker
+
+    def channel(self):
+        return FakeChannel(self._broker)
+
+    def process_data_events(self, time_limit=None):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeBroker:
+    def __init__(self, failure_rate=0.05):
+        self.failure_rate = failure_rate
+        self.batches = []
+        self.confirms = 0
+        self.connections = 0
+
+    def connect(self):
+        self.connections += 1
+        if random.random() < self.failure_rate:
+            raise pika.exceptions.AMQPConnectionError("Fake refused")
+        return FakeConnection(self)
+
+
+class Driver(amqp.Driver):
+    def __init__(self, broker, **kwargs):
+        self._broker = broker
+        super().__init__("piot", "piot", persistent=True, **kwargs)
+
+    def _connect(self):
+        return self._broker.connect()
+
+
+def main(number=20000, batch_size=100, linger=0.01, failure_rate=0.05):
+    random.seed(0)
+    broker = FakeBroker(failure_rate)
+    driver = Driver(broker, batch_size=batch_size, linger=linger,
+                    max_backoff=0.01)
+    # Fast reconnections, instead of the seconds of the first backoff
+    driver._closed.wait = lambda timeout=None: time.sleep(0.001)
+    tags = OrderedDict([("loc", "1.2.3.4"), ("host", "piot-node")])
+    start = time.perf_counter()
+    for i in range(number):
+        driver.run("bme280", 1600000000000000000 + i,
+                   OrderedDict([("temperature", 21.5), ("humidity", 40)]),
+                   tags)
+    while driver.depth():
+        time.sleep(0.01)
+    driver.close()
+    elapsed = time.perf_counter() - start
+    delivered = sum(len(body.splitlines()) for body in broker.batches)
+    print("messages   {:8d} ({:.0f}/s)".format(number, number / elapsed))
+    print("batches    {:8d} ({:.1f} messages each)".format(
+        len(broker.batches), delivered / max(len(broker.batches), 1)))
+    print("confirms   {:8d}".format(broker.confirms))
+    print("connects   {:8d}".format(broker.connections))
+    print("delivered  {:8d}".format(delivered))
+    print("dropped    {:8d}".format(driver.dropped))
+    print("lost       {:8d}".format(number - delivered - driver.dropped))
+
+
+if __name__ == "__main__":
+    main()
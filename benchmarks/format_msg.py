@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# Compares the line protocol encoder with the previous format_msg on
+# amg88xx-sized records (temperature plus 64 pixels)
+
+from collections import OrderedDict
+import random
+import timeit
+
+from piot.core import LineEncoder
+
+
+def legacy_format_msg(timestamp, measurement, tags, fields):
+    tstr = ",".join(["{}={}".format(k, v) for k, v in tags.items()])
+    fstr = ",".join(["{0}={3}{1}{2}{3}".format(
+        k, v,
+        "i" if isinstance(v, int) else "",
+        "\"" if isinstance(v, str) else "")
+        for k, v in fields.items()]
+    )
+    return "{},{} {} {}".format(measurement, tstr, fstr, timestamp)
+
+
+def sample():
+    fields = OrderedDict([("temperature", random.uniform(20, 30))])
+    for j in range(8):
+        for i in range(8):
+            fields["px{}{}".format(i, j)] = random.uniform(15, 35)
+    tags = OrderedDict([("loc", "1.2.3.4"), ("host", "piot-node"),
+                        ("amg88xx.address", 105)])
+    return 1600000000000000000, "amg88xx", tags, fields
+
+
+def main(number=20000, batch=100):
+    s = sample()
+    encoder = LineEncoder()
+    assert encoder.encode(*s) == legacy_format_msg(*s)
+    samples = [sample() for _ in range(batch)]
+    results = [
+        ("legacy", lambda: legacy_format_msg(*s)),
+        ("encoder", lambda: encoder.encode(*s)),
+        ("legacy batch", lambda: "\n".join(
+            [legacy_format_msg(*x) for x in samples])),
+        ("encoder batch", lambda: encoder.encode_batch(samples)),
+    ]
+    for name, func in results:
+        n = number // batch if "batch" in name else number
+        t = min(timeit.repeat(func, number=n, repeat=3)) / n
+        if "batch" in name:
+            t /= batch
+        print("{:<14} {:8.2f} us/record".format(name, t * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# Compares the expressions of the transform filter, compiled once into
+# closures, with evaluating their source on every sample
+
+from collections import OrderedDict
+import timeit
+
+from piot.filters.transform import Driver, _CONSTANTS, _FUNCTIONS
+
+
+FIELDS = OrderedDict([
+    ("temperature", "temperature - 0.4"),
+    ("dew_point", "dew_point(temperature, humidity)"),
+    ("heat_index", "heat_index(temperature, humidity)"),
+    ("pressure", "pressure * 100"),
+])
+
+
+def sample():
+    fields = OrderedDict([("temperature", 30.0), ("humidity", 70.0),
+                          ("pressure", 1000.0)])
+    return "bme280", 1600000000000000000, fields, ("bme280.address", 119)
+
+
+def eval_transform(sample, env=dict(_FUNCTIONS, **_CONSTANTS)):
+    driver_id, ts, fields, *tags = sample
+    fields = OrderedDict(fields)
+    for k, expr in FIELDS.items():
+        try:
+            fields[k] = eval(expr, env, fields)
+        except (KeyError, NameError, TypeError, ValueError, ArithmeticError):
+            pass
+    return [(driver_id, ts, fields, *tags)]
+
+
+def main(number=100000):
+    s = sample()
+    driver = Driver(FIELDS)
+    assert driver.run(s) == eval_transform(s)
+    results = [
+        ("eval", lambda: eval_transform(s)),
+        ("compiled", lambda: driver.run(s)),
+    ]
+    for name, func in results:
+        t = min(timeit.repeat(func, number=number, repeat=3)) / number
+        print("{:<14} {:8.2f} us/sample".format(name, t * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+from collections import defaultdict
+import contextlib
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import toml
+import tracemalloc
+
+from . import core
+from .core import TAG_ERROR, dispatch, get_filters, get_inputs, \
+    get_outputs, gpio_context, request_reload, schedule
+from .inputs import mhz14, rd200m, sds011, tfmini
+
+
+__all__ = ["Simulator", "simulated_backends", "run_bench", "main"]
+
+
+DEFAULT_CFG = {
+    "interval": 1,
+    "cycles": 10,
+    "workers": 1,
+    "bench": {
+        "smbus_latency": 0.001,
+        "serial_latency": 0.01,
+        "gpio_latency": 0.0001,
+        "error_rate": 0.0,
+        "seed": 0,
+    },
+    "inputs": {
+        "dummy": [{}, {}, {}, {}],
+        "gdk101": [{}],
+        "hmc5883l": [{}],
+        "itg320x": [{}],
+        "qmc5883l": [{}],
+        "mhz14": [{"port": "sim0"}],
+        "rd200m": [{"port": "sim1"}],
+        "sds011": [{"port": "sim2"}],
+        "tfmini": [{"port": "sim3"}],
+    },
+    "outputs": {
+        "file": [{"file": os.devnull}],
+    },
+}
+
+
+class Simulator:
+    # Shared settings of the simulated backends: latency per operation and
+    # probability of failing it
+    def __init__(self, smbus_latency=0, serial_latency=0, gpio_latency=0,
+                 error_rate=0, seed=None):
+        self.smbus_latency = smbus_latency
+        self.serial_latency = serial_latency
+        self.gpio_latency = gpio_latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def op(self, latency):
+        if latency > 0:
+            time.sleep(latency)
+        with self._lock:
+            if self._random.random() < self.error_rate:
+                raise OSError("Simulated error")
+
+    def randbytes(self, n):
+        with self._lock:
+            return bytes(self._random.randrange(256) for _ in range(n))
+
+    def smbus(self, bus=1):
+        return SimSMBus(self, bus)
+
+    def serial(self, *args, **kwargs):
+        return SimSerial(self, *args, **kwargs)
+
+
+class SimSMBus:
+    def __init__(self, sim, bus=1):
+        self._sim = sim
+        self.bus = bus
+
+    def read_i2c_block_data(self, address, register, length):
+        self._sim.op(self._sim.smbus_latency)
+        return list(self._sim.randbytes(length))
+
+    def write_byte_data(self, address, register, value):
+        self._sim.op(self._sim.smbus_latency)
+
+    def write_i2c_block_data(self, address, register, data):
+        self._sim.op(self._sim.smbus_latency)
+
+    def close(self):
+        pass
+
+
+class SimSerial:
+    # Answers the requests of the serial drivers with valid responses
+    def __init__(self, sim, port=None, baudrate=9600, timeout=None, **kwargs):
+        self._sim = sim
+        self.port = port
+        self.baudrate = baudrate
+        self._pending = b""
+
+    def reset_input_buffer(self):
+        self._pending = b""
+
+    def reset_output_buffer(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def write(self, data):
+        self._sim.op(self._sim.serial_latency)
+        if data[:2] == b"\xFF\x01":
+            res = b"\xFF" + data[2:3] + self._sim.randbytes(6)
+            res += bytes([mhz14._checksum(res)])
+        elif data[:2] == b"\xAA\xB4":
+            code = data[2:3]
+            head = (b"\xAA\xC0" + self._sim.randbytes(6)) \
+                if code == b"\x04" else \
+                (b"\xAA\xC5" + code + self._sim.randbytes(5))
+            res = head + bytes([sds011._checksum(head)]) + b"\xAB"
+        elif data == rd200m._REQUEST_SEQ:
+            res = b"\x02\x10\x04" + self._sim.randbytes(4)
+            res += bytes([rd200m._checksum(res)])
+        else:
+            res = b""
+        self._pending += res
+        return len(data)
+
+    def read(self, size=1):
+        if not self._pending:
+            self._stream()
+        res, self._pending = self._pending[:size], self._pending[size:]
+        return res
+
+    def read_until(self, expected=b"\n"):
+        if expected not in self._pending:
+            self._stream()
+        i = self._pending.find(expected)
+        i = len(self._pending) if i < 0 else i + len(expected)
+        res, self._pending = self._pending[:i], self._pending[i:]
+        return res
+
+    def _stream(self):
+        # Devices sending data continuously, like the TFmini
+        self._sim.op(self._sim.serial_latency)
+        frame = b"\x59\x59" + self._sim.randbytes(4) + b"\x00\x00"
+        self._pending += frame + bytes([tfmini._checksum(frame)])
+
+
+class SimGPIO:
+    BCM = "BCM"
+    IN, OUT = 1, 0
+    HIGH, LOW = 1, 0
+
+    def __init__(self, sim):
+        self._sim = sim
+
+    def setmode(self, mode):
+        pass
+
+    def setup(self, pins, mode, initial=None):
+        pass
+
+    def output(self, pin, value):
+        self._sim.op(self._sim.gpio_latency)
+
+    def input(self, pin):
+        self._sim.op(self._sim.gpio_latency)
+        return self.HIGH
+
+    def cleanup(self):
+        pass
+
+
+@contextlib.contextmanager
+def simulated_backends(sim):
+    saved = core.SMBus, core.Serial, core.GPIO
+    core.SMBus, core.Serial, core.GPIO = sim.smbus, sim.serial, SimGPIO(sim)
+    try:
+        yield sim
+    finally:
+        core.SMBus, core.Serial, core.GPIO = saved
+
+
+def _timed(func, times, runs=None):
+    def run(*args, **kwargs):
+        t0 = time.time()
+        if runs is not None:
+            runs.append(t0)
+        try:
+            res = func(*args, **kwargs)
+            return list(res) if res is not None else res
+        finally:
+            times.append(time.time() - t0)
+    return run
+
+
+class _Recorder:
+    # Stands in for the metrics of the kernel, keeping the scheduling delays
+    # of every run and the slots missed
+    def __init__(self, times):
+        self._times = times
+        self.missed = 0
+
+    def observe(self, stage, sid, value):
+        if stage == "jitter":
+            self._times["jitter." + sid].append(max(value, 0))
+        elif stage == "missed":
+            self.missed += value
+
+    def error(self, stage, sid):
+        pass
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run_bench(cfg):
+    # Runs the scheduler until every input has run 'cycles' slots
+    interval = cfg.get("interval", 0)
+    cycles = cfg.get("cycles", 10)
+    workers = cfg.get("workers", 1)
+    catch_up = cfg.get("catch_up", 0)
+    inputs_cfg = cfg.get("inputs", {})
+    filters_cfg = cfg.get("filters", {})
+    outputs_cfg = cfg.get("outputs", {})
+    sim = Simulator(**cfg.get("bench", {}))
+    times = defaultdict(list)
+    recorder = _Recorder(times)
+    periods = []
+    samples = errors = 0
+    tracemalloc.start()
+    saved_metrics, core._METRICS = core._METRICS, recorder
+    try:
+        with simulated_backends(sim), gpio_context(inputs_cfg), \
+                contextlib.ExitStack() as stack:
+            inputs = get_inputs(inputs_cfg, stack, workers) or []
+            filters = get_filters(filters_cfg, stack)
+            outputs = get_outputs(outputs_cfg, stack)
+            runs = []
+            for driver, _, period, *_ in inputs:
+                runs.append([])
+                driver.run = _timed(driver.run,
+                                    times["input." + driver.sid()], runs[-1])
+                periods.append(period if period is not None else interval)
+            for filter in filters:
+                filter.run = _timed(filter.run,
+                                    times["filter." + filter.sid()])
+            for output in outputs:
+                output.run = _timed(output.run,
+                                    times["output." + output.sid()])
+            base_tags = [("loc", "bench"), ("host", "bench")]
+            t_start = time.time()
+            if not runs:
+                request_reload()
+            for sample in schedule(inputs, interval, workers, catch_up):
+                samples += 1
+                errors += any(tag[0] == TAG_ERROR for tag in sample[3:])
+                t0 = time.time()
+                dispatch(outputs, sample, base_tags, filters)
+                times["dispatch"].append(time.time() - t0)
+                if not core._RELOAD and all(len(r) >= cycles for r in runs):
+                    # The samples of the runs in progress are still yielded
+                    request_reload()
+            elapsed = time.time() - t_start
+    finally:
+        core._RELOAD = False
+        core._METRICS = saved_metrics
+    # Time between consecutive runs of every input
+    for r in runs:
+        times["cycle"].extend(b - a for a, b in zip(r, r[1:]))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "samples": samples,
+        "errors": errors,
+        "elapsed": elapsed,
+        "times": times,
+        "runs": sum(len(r) for r in runs),
+        "missed": recorder.missed,
+        "overruns": sum(
+            b - a > 1.5 * p for r, p in zip(runs, periods) if p > 0
+            for a, b in zip(r, r[1:])),
+        "peak_memory": peak,
+        "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def report(res, file=sys.stdout):
+    print("Samples: {} ({} errors) in {:.3f} s, {:.1f} samples/s".format(
+        res["samples"], res["errors"], res["elapsed"],
+        res["samples"] / res["elapsed"] if res["elapsed"] else 0),
+        file=file)
+    print("{:<24} {:>7} {:>9} {:>9} {:>9} {:>9}".format(
+        "Stage (ms)", "count", "p50", "p90", "p99", "max"), file=file)
+    for name, values in sorted(res["times"].items()):
+        if not values:
+            continue
+        print("{:<24} {:>7} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f}".format(
+            name, len(values),
+            *[1e3 * _percentile(values, p) for p in (50, 90, 99)],
+            1e3 * max(values)), file=file)
+    jitter = [v for k, values in res["times"].items()
+              if k.startswith("jitter.") for v in values]
+    if jitter:
+        print("Slot jitter (ms): p50 {:.3f}, p99 {:.3f}, max {:.3f}; "
+              "{} of {} runs late by more than half an interval, "
+              "{} slots missed".format(
+                  *[1e3 * _percentile(jitter, p) for p in (50, 99)],
+                  1e3 * max(jitter), res["overruns"], res["runs"],
+                  res["missed"]), file=file)
+    print("Memory: peak traced {:.1f} KiB, max RSS {} KiB".format(
+        res["peak_memory"] / 1024, res["max_rss"]), file=file)
+
+
+def main(args=None):
+    args = sys.argv[1:] if args is None else args
+    cfg = dict(DEFAULT_CFG)
+    if args:
+        user_cfg = toml.load(args[0])
+        cfg.update(user_cfg)
+        cfg["bench"] = dict(DEFAULT_CFG["bench"], **user_cfg.get("bench", {}))
+    report(run_bench(cfg))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,16 @@
 #!/usr/bin/env python3
 
+from array import array
+import asyncio
+import base64
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import contextlib
+import heapq
 import importlib
+import json
+import os
+import queue
 import signal
 import socket
 import sys
@@ -10,32 +18,110 @@ import threading
 import time
 import toml
 import traceback
-import urllib.request
 
-from serial import Serial
-from smbus2 import SMBus
-try:
-    import RPi.GPIO as GPIO
-except ImportError:
-    GPIO = None
+
+# Hardware backends, imported when first needed
+Serial = SMBus = GPIO = None
 
 
 __all__ = [
-    "get_inputs", "get_outputs", "collect",
+    "get_inputs", "get_filters", "get_outputs",
+    "collect", "schedule", "dispatch", "apply_filters", "acollect", "arun",
+    "format_msg", "LineEncoder", "Frame",
     "gpio_context", "activation_context",
-    "DriverBase", "SMBusDriver", "SerialDriver"
+    "DriverBase", "I2CDriver", "SMBusDriver", "SerialDriver", "QueuedOutput",
+    "DriverSet", "request_reload", "SharedBus", "get_bus", "get_busio_i2c",
+    "bus_stats", "power_on", "power_off", "power_stats"
 ]
 
 
 TAG_ERROR = "ERROR"
 ACT_PIN_ID = "ACTIVATION_PIN"
+INTERVAL_ID = "INTERVAL"
+WARMUP_ID = "WARMUP"
+SPOOL_ID = "SPOOL"
+QUEUE_ID = "QUEUE"
+# Measurement of the self-metrics, which bypass the filters
+METRICS_ID = "piot"
+_CLOCK_STEP = 1
 _TERM_CV = threading.Condition()
 _TERMINATED = False
+_RELOAD = False
+_METRICS = None
+_BUSES = {}
+_BUSES_LOCK = threading.Lock()
+_BUSIO = None
+_PINS = {}
+_PINS_LOCK = threading.Lock()
+_KEPT_PINS = []
+
+
+def terminate():
+    global _TERMINATED
+    _TERMINATED = True
+    with _TERM_CV:
+        _TERM_CV.notify_all()
+
+
+def request_reload():
+    # The running schedule returns as soon as possible, so that the new
+    # configuration can be loaded
+    global _RELOAD
+    _RELOAD = True
+    with _TERM_CV:
+        _TERM_CV.notify_all()
+
+
+def _serial(*args, **kwargs):
+    global Serial
+    if Serial is None:
+        from serial import Serial
+    return Serial(*args, **kwargs)
+
+
+def _smbus(bus):
+    global SMBus
+    if SMBus is None:
+        from smbus2 import SMBus
+    return SMBus(bus)
 
 
-def get_external_ip():
-    with urllib.request.urlopen("https://ifconfig.me/") as f:
-        return f.read().decode('utf-8')
+def _gpio():
+    global GPIO
+    if GPIO is None:
+        import RPi.GPIO as GPIO
+    return GPIO
+
+
+def get_external_ip(timeout=5, cache=None):
+    # Falls back to the last known address, stored in the cache file
+    import urllib.request
+    try:
+        with urllib.request.urlopen("https://ifconfig.me/",
+                                    timeout=timeout) as f:
+            ip = f.read().decode('utf-8')
+    except OSError:
+        if cache is None:
+            raise
+        with open(cache) as f:
+            return f.read()
+    if cache is not None:
+        try:
+            os.makedirs(os.path.dirname(cache), exist_ok=True)
+            with open(cache + ".tmp", "w") as f:
+                f.write(ip)
+            os.replace(cache + ".tmp", cache)
+        except OSError:
+            traceback.print_exc()
+    return ip
+
+
+def _cached_external_ip(cache):
+    try:
+        with open(cache) as f:
+            return f.read()
+    except OSError:
+        return None
 
 
 def find(obj, key):
@@ -49,15 +135,104 @@ def find(obj, key):
             yield from find(v, key)
 
 
+def _escape(s, chars=",= "):
+    s = str(s)
+    for c in chars:
+        if c in s:
+            s = s.replace(c, "\\" + c)
+    return s
+
+
+class LineEncoder:
+    # Line protocol encoder caching the escaped "measurement,tags" prefix of
+    # each tag set, as well as the escaped field keys
+    def __init__(self, cache_size=4096):
+        self._cache_size = cache_size
+        self._prefixes = {}
+        self._keys = {}
+
+    def prefix(self, measurement, tags):
+        key = (measurement, tuple(tags.items()))
+        try:
+            return self._prefixes[key]
+        except KeyError:
+            pass
+        if len(self._prefixes) >= self._cache_size:
+            self._prefixes.clear()
+        res = _escape(measurement, ", ") + "".join(
+            [",{}={}".format(_escape(k), _escape(v))
+             for k, v in tags.items()]) + " "
+        self._prefixes[key] = res
+        return res
+
+    def fields(self, fields):
+        keys = self._keys
+        parts = []
+        for k, v in fields.items():
+            try:
+                ek = keys[k]
+            except KeyError:
+                if len(keys) >= self._cache_size:
+                    keys.clear()
+                ek = keys[k] = _escape(k) + "="
+            t = type(v)
+            if t is float:
+                parts.append(ek + repr(v))
+            elif t is int:
+                parts.append(ek + str(v) + "i")
+            elif t is bool:
+                parts.append(ek + ("true" if v else "false"))
+            elif t is str:
+                parts.append(ek + '"' + _escape(v, "\\\"") + '"')
+            elif t is Frame:
+                parts.append(ek + '"' + str(v) + '"')
+            else:
+                parts.append(ek + str(v))
+        return ",".join(parts)
+
+    def encode(self, timestamp, measurement, tags, fields):
+        return self.prefix(measurement, tags) + self.fields(fields) + \
+            " " + str(timestamp)
+
+    def encode_batch(self, samples, sep="\n"):
+        # Samples as (timestamp, measurement, tags, fields)
+        return sep.join([self.encode(*sample) for sample in samples])
+
+
+class Frame:
+    # Packed float32 values with their shape, sent as a single field
+    __slots__ = ("data", "shape")
+
+    def __init__(self, data, shape):
+        self.data = data
+        self.shape = shape
+
+    def tobytes(self):
+        if sys.byteorder == "little":
+            return self.data.tobytes()
+        data = array(self.data.typecode, self.data)
+        data.byteswap()
+        return data.tobytes()
+
+    def __str__(self):
+        return "{}:{}".format("x".join(map(str, self.shape)),
+                              base64.b64encode(self.tobytes()).decode())
+
+    @classmethod
+    def fromstring(cls, s):
+        # Inverse of str
+        shape, data = s.split(":")
+        data = array("f", base64.b64decode(data))
+        if sys.byteorder != "little":
+            data.byteswap()
+        return cls(data, tuple(int(n) for n in shape.split("x")))
+
+
+_ENCODER = LineEncoder()
+
+
 def format_msg(timestamp, measurement, tags, fields):
-    tstr = ",".join(["{}={}".format(k, v) for k, v in tags.items()])
-    fstr = ",".join(["{0}={3}{1}{2}{3}".format(
-        k, v,
-        "i" if isinstance(v, int) else "",
-        "\"" if isinstance(v, str) else "")
-        for k, v in fields.items()]
-    )
-    return "{},{} {} {}".format(measurement, tstr, fstr, timestamp)
+    return _ENCODER.encode(timestamp, measurement, tags, fields)
 
 
 def sync_wait(sync):
@@ -68,116 +243,977 @@ def round_step(x, step):
     return x // step * step if step else x
 
 
-def get_inputs(cfg, stack):
+def _load_driver(family, driver_id, dcfg):
+    driver_module = importlib.import_module(
+        "piot.{}.{}".format(family, driver_id))
+    return getattr(driver_module, "Driver")(**dcfg)
+
+
+def _report_load(family, driver_id, item, elapsed):
+    driver = item[0] if family == "inputs" else item
+    print("Loaded {}.{} in {:.3f} s".format(family, driver_id, elapsed),
+          file=sys.stderr)
+    if _METRICS is not None:
+        _METRICS.observe("init", driver.sid(), elapsed)
+
+
+def _load_input(driver_id, dcfg):
+    with error_context():
+        pin = dcfg.get(ACT_PIN_ID)
+        interval = dcfg.get(INTERVAL_ID)
+        warmup = dcfg.get(WARMUP_ID)
+        dcfg = {k: v for k, v in dcfg.items()
+                if k not in (ACT_PIN_ID, INTERVAL_ID, WARMUP_ID)}
+        driver = _load_driver("inputs", driver_id, dcfg)
+        if warmup:
+            driver.warmup = driver.default_warmup if warmup is True \
+                else warmup
+        tags = [(driver_id + "." + k, v)
+                for k, v in dcfg.items()
+                if type(v) in (int, float, bool, str)]
+        return (driver, pin, interval, *tags)
+
+
+def _load_filter(driver_id, dcfg):
+    with error_context():
+        return _load_driver("filters", driver_id, dcfg)
+
+
+def _load_output(driver_id, dcfg):
+    with error_context():
+        spool = dcfg.get(SPOOL_ID)
+        qcfg = dcfg.get(QUEUE_ID)
+        dcfg = {k: v for k, v in dcfg.items()
+                if k not in (SPOOL_ID, QUEUE_ID)}
+        driver = _load_driver("outputs", driver_id, dcfg)
+        if spool is not None:
+            from .spool import SpooledOutput
+            driver = SpooledOutput(driver, **spool)
+        if qcfg is not None:
+            driver = QueuedOutput(driver, **qcfg)
+        return driver
+
+
+def _load_all(loader, jobs, workers=1, family=None):
+    # With several workers, the instances of different drivers are loaded in
+    # parallel, those of the same driver one after the other; the result
+    # keeps the order of the jobs, with None for those that failed
+    # The load times are only reported with the family, by the configuration
+    # (not by drivers loading their own, like vertpantilt)
+    groups = OrderedDict()
+    for i, (driver_id, dcfg) in enumerate(jobs):
+        groups.setdefault(driver_id, []).append((i, dcfg))
+    res = [None] * len(jobs)
+
+    def load(item):
+        driver_id, group = item
+        for i, dcfg in group:
+            t0 = time.perf_counter()
+            res[i] = loader(driver_id, dcfg)
+            if family is not None and res[i] is not None:
+                _report_load(family, driver_id, res[i],
+                             time.perf_counter() - t0)
+    if workers > 1 and len(groups) > 1:
+        with ThreadPoolExecutor(
+                max_workers=min(workers, len(groups))) as pool:
+            list(pool.map(load, groups.items()))
+    else:
+        for item in groups.items():
+            load(item)
+    return res
+
+
+def _jobs(cfg):
+    return [(driver_id, dcfg) for driver_id in cfg for dcfg in cfg[driver_id]]
+
+
+def get_inputs(cfg, stack, workers=1):
     if not cfg:
         return None
-    inputs = []
-    for driver_id in cfg:
-        for dcfg in cfg[driver_id]:
-            with error_context():
-                pin = None
-                if ACT_PIN_ID in dcfg:
-                    pin = dcfg[ACT_PIN_ID]
-                    dcfg = {k: v for k, v in dcfg.items() if k != ACT_PIN_ID}
-                driver_module = importlib.import_module(
-                    "piot.inputs." + driver_id)
-                driver = getattr(driver_module, "Driver")(**dcfg)
-                tags = [(driver_id + "." + k, v)
-                        for k, v in dcfg.items()
-                        if type(v) in (int, float, bool, str)]
-                inputs.append((stack.enter_context(driver), pin, *tags))
-    return inputs
+    return [(stack.enter_context(input[0]), *input[1:])
+            for input in _load_all(_load_input, _jobs(cfg), workers)
+            if input is not None]
+
+
+def get_filters(cfg, stack):
+    return [stack.enter_context(filter)
+            for filter in _load_all(_load_filter, _jobs(cfg))
+            if filter is not None]
 
 
 def get_outputs(cfg, stack):
-    outputs = []
-    for driver_id in cfg:
-        for dcfg in cfg[driver_id]:
-            with error_context():
-                driver_module = importlib.import_module(
-                    "piot.outputs." + driver_id)
-                driver = getattr(driver_module, "Driver")(**dcfg)
-                outputs.append(stack.enter_context(driver))
-    return outputs
+    return [stack.enter_context(output)
+            for output in _load_all(_load_output, _jobs(cfg))
+            if output is not None]
+
+
+class DriverSet:
+    # Drivers of a configuration, each in its own exit stack, so that loading
+    # a new configuration only closes and loads the drivers whose entries
+    # changed, keeping the rest (and their state) alive
+    _LOADERS = (
+        ("inputs", _load_input),
+        ("filters", _load_filter),
+        ("outputs", _load_output),
+    )
+
+    def __init__(self, workers=1, base_tags=()):
+        self._workers = workers
+        self._base_tags = base_tags
+        self._loaded = OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
+    def update(self, inputs_cfg, filters_cfg, outputs_cfg):
+        # Returns the lists of inputs, filters and outputs
+        plan = []
+        for (family, loader), cfg in zip(
+                self._LOADERS, (inputs_cfg, filters_cfg, outputs_cfg)):
+            counts = {}
+            entries = []
+            for driver_id, dcfg in _jobs(cfg):
+                key = (family, driver_id,
+                       json.dumps(dcfg, sort_keys=True, default=str))
+                counts[key] = counts.get(key, 0) + 1
+                entries.append(((*key, counts[key]), driver_id, dcfg))
+            plan.append((family, loader, entries))
+        keys = {key for _, _, entries in plan for key, _, _ in entries}
+        unloaded = [k for k in self._loaded if k not in keys]
+        self._flush(unloaded)
+        for key in reversed(unloaded):
+            print("Unloading {}.{}".format(*key[:2]), file=sys.stderr)
+            self._close(self._loaded.pop(key)[1])
+        res = []
+        for family, loader, entries in plan:
+            new = [(key, driver_id, dcfg) for key, driver_id, dcfg in entries
+                   if key not in self._loaded]
+            loaded = _load_all(loader, [(driver_id, dcfg)
+                                        for _, driver_id, dcfg in new],
+                               self._workers, family)
+            for (key, _, _), item in zip(new, loaded):
+                if item is None:
+                    # Retried on the next update
+                    continue
+                stack = contextlib.ExitStack()
+                stack.enter_context(item[0] if family == "inputs" else item)
+                self._loaded[key] = (item, stack)
+            res.append([self._loaded[key][0] for key, _, _ in entries
+                        if key in self._loaded])
+        return res
 
-def collect(inputs, sync=0):
+    def close(self):
+        self._flush(list(self._loaded))
+        while self._loaded:
+            self._close(self._loaded.popitem()[1][1])
+
+    def _flush(self, keys):
+        # Samples still pending in the filters about to be closed (see
+        # filters.aggregate), sent to the outputs before any of them is closed
+        # and without going through the rest of the filters
+        outputs = [item for key, (item, _) in self._loaded.items()
+                   if key[0] == "outputs"]
+        for key in keys:
+            filter = self._loaded[key][0]
+            if key[0] != "filters" or not hasattr(filter, "flush"):
+                continue
+            try:
+                samples = filter.flush()
+            except Exception:
+                traceback.print_exc()
+                continue
+            for driver_id, ts, fields, *tags in samples:
+                dtags = OrderedDict(list(self._base_tags) + tags)
+                for output in outputs:
+                    try:
+                        output.run(driver_id, ts, fields, dtags)
+                    except Exception:
+                        traceback.print_exc()
+
+    def _close(self, stack):
+        try:
+            stack.close()
+        except Exception:
+            traceback.print_exc()
+
+
+def collect(inputs, sync=0, workers=1):
     sync_ns = int(sync * 1e9)
     with error_context(), _TERM_CV:
         _TERM_CV.wait(sync_wait(sync))
-    for input, pin, *cfg_tags in inputs:
+    if workers > 1 and len(inputs) > 1:
+        yield from _collect_concurrent(inputs, sync_ns, workers)
+    else:
+        for input in inputs:
+            yield from _run_input(input, sync_ns)
+
+
+class _SlotClock:
+    # Slots are the multiples of a period on the wall clock, waited for with
+    # monotonic deadlines; the offset between both clocks follows the slewing
+    # of NTP, and its steps are detected
+    def __init__(self):
+        self.offset = time.time() - time.monotonic()
+
+    def update(self):
+        # Returns whether the wall clock has been stepped
+        offset = time.time() - time.monotonic()
+        stepped = abs(offset - self.offset) > _CLOCK_STEP
+        self.offset = offset
+        return stepped
+
+    def current(self, period):
+        return int((time.monotonic() + self.offset) // period)
+
+    def deadline(self, slot, period):
+        return slot * period - self.offset
+
+
+class _Warmup:
+    # Powers the activation pins of the inputs with a warm-up time that long
+    # before their slots, in its own thread so that the device is warming up
+    # while others are read; those whose period is not longer than their
+    # warm-up time are kept powered, also across reloads
+    def __init__(self, inputs, interval):
+        self._warmups = {}
+        self._pins = {}
+        self._always = []
+        for i, (driver, pin, period, *_) in enumerate(inputs):
+            if pin is None or not driver.warmup:
+                continue
+            self._warmups[i] = (pin, driver.warmup)
+            period = period if period is not None else interval
+            if period <= driver.warmup:
+                power_on(pin)
+                self._always.append(pin)
+            else:
+                self._pins[i] = (pin, driver.warmup)
+        # Released once the new ones are held, so that those still kept on
+        # are not switched off in between
+        with _PINS_LOCK:
+            kept = _KEPT_PINS[:]
+            del _KEPT_PINS[:]
+        for pin in kept:
+            power_off(pin)
+        self._cv = threading.Condition()
+        self._plans = {}
+        self._held = set()
+        self._closed = False
+        self._thread = None
+        if self._pins:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+
+    def delay(self, i):
+        # Time until the device of input i is warm: its whole warm-up time
+        # unless its pin is already powered
+        if i not in self._warmups:
+            return 0
+        pin, warmup = self._warmups[i]
+        with _PINS_LOCK:
+            state = _PINS.get(pin)
+            if state is None or state.on_since is None:
+                return warmup
+            return max(warmup - (time.monotonic() - state.on_since), 0)
+
+    def plan(self, entry):
+        deadline, i = entry[:2]
+        if i in self._pins:
+            with self._cv:
+                self._plans[i] = deadline - self._pins[i][1]
+                self._cv.notify()
+
+    def done(self, i):
+        # The pin is released once its input has been run
+        if i in self._pins:
+            with self._cv:
+                if i in self._held:
+                    self._held.remove(i)
+                    power_off(self._pins[i][0])
+
+    def _loop(self):
+        with self._cv:
+            while not self._closed:
+                now = time.monotonic()
+                for i, t in list(self._plans.items()):
+                    if t <= now:
+                        del self._plans[i]
+                        if i not in self._held:
+                            self._held.add(i)
+                            power_on(self._pins[i][0])
+                self._cv.wait(min(self._plans.values()) - now
+                              if self._plans else None)
+
+    def close(self):
+        if self._thread is not None:
+            with self._cv:
+                self._closed = True
+                self._cv.notify()
+            self._thread.join()
+        for i in self._held:
+            power_off(self._pins[i][0])
+        self._held.clear()
+        # Handed over to the next schedule, if any
+        with _PINS_LOCK:
+            _KEPT_PINS.extend(self._always)
+        self._always = []
+
+
+def _first_entry(clock, i, period, delay=0):
+    # Heap entries as (deadline, input index, period, slot), the first slot
+    # being the next one after 'delay' seconds
+    if period > 0:
+        slot = int((time.monotonic() + clock.offset + delay) // period) + 1
+        return (clock.deadline(slot, period), i, period, slot)
+    return (time.monotonic() + delay, i, period, None)
+
+
+def _next_entry(clock, entry):
+    _, i, period, slot = entry
+    if slot is None:
+        return (time.monotonic(), i, period, None)
+    # A slot ahead of the next one means that the clock went back
+    next_slot = min(slot + 1, clock.current(period) + 1)
+    return (clock.deadline(next_slot, period), i, period, next_slot)
+
+
+def _due_entry(clock, inputs, entry, catch_up):
+    # The latest slot already due is run late, as well as up to 'catch_up'
+    # slots before it; older ones are skipped and reported as missed
+    deadline, i, period, slot = entry
+    if slot is None:
+        return entry
+    missed = clock.current(period) - catch_up - slot
+    if missed <= 0:
+        return entry
+    sid = inputs[i][0].sid()
+    print("Input {} missed {} slot(s)".format(sid, missed), file=sys.stderr)
+    if _METRICS is not None:
+        _METRICS.observe("missed", sid, missed)
+    slot += missed
+    return (clock.deadline(slot, period), i, period, slot)
+
+
+def _realign(clock, heap, warmup):
+    print("Wall clock stepped, realigning slots", file=sys.stderr)
+    heap = [_first_entry(clock, i, period, warmup.delay(i))
+            for _, i, period, _ in heap]
+    heapq.heapify(heap)
+    for entry in heap:
+        warmup.plan(entry)
+    return heap
+
+
+def _run_entry(inputs, entry):
+    deadline, i, period, slot = entry
+    if _METRICS is not None:
+        _METRICS.observe("jitter", inputs[i][0].sid(),
+                         time.monotonic() - deadline)
+    sync_ns = int(period * 1e9)
+    return _run_input(inputs[i], sync_ns,
+                      slot * sync_ns if slot is not None else None)
+
+
+def schedule(inputs, interval=0, workers=1, catch_up=0):
+    # Each input is run at its own interval (or the global one) in slots
+    # aligned to multiples of that interval, and its samples are timestamped
+    # with the slot; slots that cannot be run in time are reported as missed,
+    # unless they are within the last 'catch_up', which are run late
+    inputs = inputs or []
+    clock = _SlotClock()
+    warmup = _Warmup(inputs, interval)
+    heap = [_first_entry(clock, i, input[2] if input[2] is not None
+                         else interval, warmup.delay(i))
+            for i, input in enumerate(inputs)]
+    heapq.heapify(heap)
+    try:
+        for entry in heap:
+            warmup.plan(entry)
+        if workers > 1 and len(inputs) > 1:
+            yield from _schedule_concurrent(inputs, heap, workers, clock,
+                                            catch_up, warmup)
+            return
+        while not _RELOAD:
+            _wait_until(heap[0][0] if heap else None)
+            if clock.update():
+                heap = _realign(clock, heap, warmup)
+            now = time.monotonic()
+            while heap and heap[0][0] <= now:
+                entry = _due_entry(clock, inputs, heapq.heappop(heap),
+                                   catch_up)
+                try:
+                    yield from _run_entry(inputs, entry)
+                finally:
+                    warmup.done(entry[1])
+                entry = _next_entry(clock, entry)
+                warmup.plan(entry)
+                heapq.heappush(heap, entry)
+    finally:
+        warmup.close()
+
+
+def _schedule_concurrent(inputs, heap, workers, clock, catch_up, warmup):
+    locks = {}
+    for group in resource_groups(inputs):
+        lock = threading.Lock()
+        for input in group:
+            locks[id(input)] = lock
+    samples = queue.Queue()
+    done = queue.Queue()
+
+    def job(entry):
         try:
-            with error_context(True), activation_context(pin):
-                res = input.run()
-                for did, ts, fields, *tags in res:
-                    tags.extend(cfg_tags)
-                    yield (did, round_step(ts, sync_ns), fields, *tags)
-        except Exception:
-            ts = round_step(time.time_ns(), sync_ns)
-            yield (input.sid(), ts, None, *cfg_tags, (TAG_ERROR, None))
+            if not _TERMINATED:
+                with locks[id(inputs[entry[1]])]:
+                    for sample in _run_entry(inputs, entry):
+                        samples.put(sample)
+        finally:
+            warmup.done(entry[1])
+            done.put(entry)
+            with _TERM_CV:
+                _TERM_CV.notify_all()
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(inputs))) as pool:
+        while not _RELOAD:
+            while not samples.empty():
+                yield samples.get()
+            if clock.update():
+                heap = _realign(clock, heap, warmup)
+            while not done.empty():
+                entry = _next_entry(clock, done.get())
+                warmup.plan(entry)
+                heapq.heappush(heap, entry)
+            now = time.monotonic()
+            while heap and heap[0][0] <= now:
+                pool.submit(job, _due_entry(clock, inputs, heapq.heappop(heap),
+                                            catch_up))
+            with error_context(), _TERM_CV:
+                if samples.empty() and done.empty() and not _RELOAD:
+                    _TERM_CV.wait(heap[0][0] - now if heap else None)
+    # Samples of the jobs still running when the reload was requested
+    while not samples.empty():
+        yield samples.get()
+
+
+def _wait_until(deadline):
+    with error_context(), _TERM_CV:
+        if not _RELOAD:
+            _TERM_CV.wait(max(deadline - time.monotonic(), 0)
+                          if deadline is not None else None)
+
+
+def _slot_ts(ts, sync_ns, slot_ns, run):
+    # The first sample of a run measured after its start (run[0]) gets the
+    # timestamp of its slot, and the rest keep their offsets from it (run[1]);
+    # samples buffered by the driver before the run keep their own timestamps
+    if slot_ns is None:
+        return round_step(ts, sync_ns)
+    if ts < run[0]:
+        return ts
+    if len(run) == 1:
+        run.append(ts)
+    return slot_ns + round_step(ts - run[1], sync_ns)
+
+
+def _run_input(input, sync_ns, slot_ns=None):
+    input, pin, _, *cfg_tags = input
+    metrics = _METRICS
+    run = [time.time_ns()]
+    try:
+        with error_context(True), activation_context(pin):
+            t0 = time.perf_counter()
+            res = input.run()
+            if metrics is not None:
+                elapsed = time.perf_counter() - t0
+                if isinstance(res, list):
+                    metrics.observe("input", input.sid(), elapsed)
+                else:
+                    res = _timed_iter(res, metrics, input.sid(), elapsed)
+            for did, ts, fields, *tags in res:
+                tags.extend(cfg_tags)
+                yield (did, _slot_ts(ts, sync_ns, slot_ns, run), fields,
+                       *tags)
+    except Exception:
+        if metrics is not None:
+            metrics.error("input", input.sid())
+        ts = _slot_ts(time.time_ns(), sync_ns, slot_ns, run)
+        yield (input.sid(), ts, None, *cfg_tags, (TAG_ERROR, None))
+
+
+def _timed_iter(res, metrics, sid, elapsed):
+    # Time spent in the driver only, not in the consumer of its samples
+    it = iter(res)
+    try:
+        while True:
+            t0 = time.perf_counter()
+            try:
+                sample = next(it)
+            except StopIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - t0
+            yield sample
+    finally:
+        metrics.observe("input", sid, elapsed)
+
+
+def _run_group(group, sync_ns, q):
+    try:
+        for input in group:
+            for sample in _run_input(input, sync_ns):
+                q.put(sample)
+    finally:
+        q.put(None)
+
+
+def _collect_concurrent(inputs, sync_ns, workers):
+    groups = resource_groups(inputs)
+    q = queue.Queue()
+    with ThreadPoolExecutor(max_workers=min(workers, len(groups))) as pool:
+        for group in groups:
+            pool.submit(_run_group, group, sync_ns, q)
+        pending = len(groups)
+        while pending:
+            sample = q.get()
+            if sample is None:
+                pending -= 1
+            else:
+                yield sample
+
+
+async def acollect(inputs, sync=0):
+    # Asynchronous counterpart of collect, running the inputs one by one
+    sync_ns = int(sync * 1e9)
+    await asyncio.sleep(sync_wait(sync))
+    for input in inputs:
+        async for sample in _arun_input(input, sync_ns):
+            yield sample
+
+
+def arun(inputs, outputs, base_tags, interval=0, workers=1, filters=(),
+         catch_up=0):
+    # Runs every input in a task of a single event loop, up to 'workers' at
+    # the same time; drivers without a native arun run in an executor
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(
+            _arun(inputs, outputs, base_tags, interval, workers, filters,
+                  catch_up))
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+    if _TERMINATED:
+        raise TerminationError()
+
+
+async def _arun(inputs, outputs, base_tags, interval, workers, filters,
+                catch_up):
+    stop = asyncio.Event()
+    clock = _SlotClock()
+
+    def handle_term():
+        terminate()
+        stop.set()
+
+    def handle_reload():
+        request_reload()
+        stop.set()
+    loop = asyncio.get_event_loop()
+    loop.add_signal_handler(signal.SIGTERM, handle_term)
+    loop.add_signal_handler(signal.SIGHUP, handle_reload)
+    semaphore = asyncio.Semaphore(max(workers, 1))
+    locks = {}
+    for group in resource_groups(inputs):
+        lock = asyncio.Lock()
+        for input in group:
+            locks[id(input)] = lock
+
+    warmup = _Warmup(inputs, interval)
+
+    async def run_input(i, input):
+        entry = _first_entry(clock, i, input[2] if input[2] is not None
+                             else interval, warmup.delay(i))
+        warmup.plan(entry)
+        while True:
+            deadline, _, period, slot = entry
+            try:
+                await asyncio.wait_for(
+                    stop.wait(), max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                pass
+            if stop.is_set():
+                break
+            if clock.update():
+                print("Wall clock stepped, realigning slots", file=sys.stderr)
+                entry = _first_entry(clock, i, period, warmup.delay(i))
+                warmup.plan(entry)
+                continue
+            entry = _due_entry(clock, inputs, entry, catch_up)
+            deadline, _, period, slot = entry
+            async with locks[id(input)], semaphore:
+                if _METRICS is not None:
+                    _METRICS.observe("jitter", input[0].sid(),
+                                     time.monotonic() - deadline)
+                sync_ns = int(period * 1e9)
+                try:
+                    async for sample in _arun_input(
+                            input, sync_ns,
+                            slot * sync_ns if slot is not None else None):
+                        dispatch(outputs, sample, base_tags, filters)
+                finally:
+                    warmup.done(i)
+            entry = _next_entry(clock, entry)
+            warmup.plan(entry)
+
+    try:
+        await asyncio.gather(*[run_input(i, input)
+                               for i, input in enumerate(inputs)],
+                             return_exceptions=True)
+    finally:
+        warmup.close()
+
+
+async def _aiter(res):
+    for sample in res:
+        yield sample
+
+
+async def _arun_input(input, sync_ns, slot_ns=None):
+    input, pin, _, *cfg_tags = input
+    metrics = _METRICS
+    run = [time.time_ns()]
+    try:
+        with activation_context(pin):
+            t0 = time.perf_counter()
+            res = input.arun()
+            if not hasattr(res, "__aiter__"):
+                res = _aiter(await res)
+                if metrics is not None:
+                    metrics.observe("input", input.sid(),
+                                    time.perf_counter() - t0)
+            async for did, ts, fields, *tags in res:
+                tags.extend(cfg_tags)
+                yield (did, _slot_ts(ts, sync_ns, slot_ns, run), fields,
+                       *tags)
+    except Exception:
+        traceback.print_exc()
+        if metrics is not None:
+            metrics.error("input", input.sid())
+        ts = _slot_ts(time.time_ns(), sync_ns, slot_ns, run)
+        yield (input.sid(), ts, None, *cfg_tags, (TAG_ERROR, None))
+
+
+def resource_groups(inputs):
+    # Inputs sharing an activation pin, bus or port are chained into the same
+    # group, so that they never run at the same time
+    groups = []
+    owners = {}
+    for input in inputs:
+        driver, pin = input[:2]
+        keys = list(driver.resources())
+        if pin is not None:
+            keys.append((ACT_PIN_ID, pin))
+        merged = {id(owners[k]): owners[k] for k in keys if k in owners}
+        group = [input]
+        for other in merged.values():
+            groups.remove(other)
+            group = other + group
+        groups.append(group)
+        for member in group:
+            for k in member[0].resources():
+                owners[k] = group
+            if member[1] is not None:
+                owners[(ACT_PIN_ID, member[1])] = group
+    return groups
+
+
+def apply_filters(filters, sample):
+    samples = [sample]
+    for filter in filters:
+        res = []
+        for sample in samples:
+            try:
+                with error_context(True):
+                    res.extend(filter.run(sample))
+            except Exception:
+                # Let the sample through untouched
+                res.append(sample)
+        samples = res
+    return samples
+
+
+def dispatch(outputs, sample, base_tags, filters=()):
+    samples = apply_filters(filters, sample) \
+        if filters and sample[0] != METRICS_ID else (sample,)
+    for driver_id, ts, fields, *tags in samples:
+        if fields:
+            fields = OrderedDict([(k, v) for k, v in fields.items()
+                                 if v is not None])
+        dtags = OrderedDict(base_tags + tags)
+        for output in outputs:
+            with error_context():
+                if _METRICS is None:
+                    output.run(driver_id, ts, fields, dtags)
+                else:
+                    _run_timed_output(output, driver_id, ts, fields, dtags)
+
+
+def _run_timed_output(output, *args):
+    t0 = time.perf_counter()
+    try:
+        output.run(*args)
+    except Exception:
+        _METRICS.error("output", output.sid())
+        raise
+    finally:
+        _METRICS.observe("output", output.sid(), time.perf_counter() - t0)
 
 
 def main():
     if len(sys.argv) <= 1:
         print("Usage: {} <cfg_file>".format(sys.argv[0]))
+        print("       {} bench [<cfg_file>]".format(sys.argv[0]))
+        print("       {} decode [<file>...]".format(sys.argv[0]))
         exit()
+    if sys.argv[1] == "bench":
+        from .bench import main as bench_main
+        bench_main(sys.argv[2:])
+        return
+    if sys.argv[1] == "decode":
+        from .wire import main as decode_main
+        decode_main(sys.argv[2:])
+        return
     cfg_file = sys.argv[1]
+    global _METRICS
 
-    # Termination handling
+    # Termination and reload handling
     def handle_term(signum, frame):
-        global _TERMINATED
-        _TERMINATED = True
-        with _TERM_CV:
-            _TERM_CV.notify_all()
+        terminate()
+
+    def handle_reload(signum, frame):
+        request_reload()
     signal.signal(signal.SIGTERM, handle_term)
+    signal.signal(signal.SIGHUP, handle_reload)
 
     # Read configuration
     cfg = toml.load(cfg_file)
     interval = cfg.get("interval", 0)
-    loc = cfg.get("loc", get_external_ip())
+    workers = cfg.get("workers", 1)
+    use_asyncio = cfg.get("asyncio", False)
+    processes = cfg.get("processes", 1)
+    catch_up = cfg.get("catch_up", 0)
+    loc = cfg.get("loc")
     host = cfg.get("host", socket.gethostname())
     inputs_cfg = cfg.get("inputs", {})
+    filters_cfg = cfg.get("filters", {})
     outputs_cfg = cfg.get("outputs", {})
+    metrics_cfg = cfg.get("metrics")
+    ip_cache = os.path.expanduser(
+        cfg.get("ip_cache", "~/.cache/piot/external_ip"))
+    ip_timeout = cfg.get("ip_timeout", 5)
+    if cfg.get("watch", False):
+        threading.Thread(target=_watch, args=(cfg_file,),
+                         daemon=True).start()
+    if metrics_cfg is not None:
+        from .metrics import Metrics, Driver as MetricsDriver
+        _METRICS = Metrics()
+
+    # The external address is looked up while the drivers are loaded, and only
+    # waited for if it has never been cached
+    base_tags = [("loc", loc), ("host", host)]
+    loc_thread = None
+    if loc is None:
+        loc = _cached_external_ip(ip_cache)
+        base_tags[0] = ("loc", loc or "unknown")
+
+        def refresh_loc():
+            with error_context():
+                base_tags[0] = ("loc", get_external_ip(ip_timeout, ip_cache))
+        loc_thread = threading.Thread(target=refresh_loc, daemon=True)
+        loc_thread.start()
 
     # Run drivers
     try:
-        print("Piot started", file=sys.stderr)
-        with gpio_context(inputs_cfg), contextlib.ExitStack() as stack:
-            inputs = get_inputs(inputs_cfg, stack)
-            outputs = get_outputs(outputs_cfg, stack)
+        t0 = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            pool = None
+            if processes > 1:
+                # Forked before any output is loaded, the workers load their
+                # own shards of the inputs
+                from .shard import ShardPool
+                pool = stack.enter_context(ShardPool(cfg_file, processes))
+                inputs_cfg = {}
+            stack.enter_context(gpio_context(inputs_cfg))
+            drivers = stack.enter_context(DriverSet(workers, base_tags))
+            inputs, filters, outputs = drivers.update(
+                inputs_cfg, filters_cfg, outputs_cfg)
+            extra_inputs = []
+            if metrics_cfg is not None:
+                driver = MetricsDriver(_METRICS, outputs,
+                                       metrics_cfg.get("file"))
+                extra_inputs.append(
+                    (driver, None, metrics_cfg.get("interval", 60)))
+            if loc_thread is not None and loc is None:
+                loc_thread.join()
+            print("Piot started in {:.3f} s".format(time.perf_counter() - t0),
+                  file=sys.stderr)
             while True:
-                for driver_id, ts, fields, *tags in collect(inputs, interval):
-                    if fields:
-                        fields = OrderedDict([(k, v) for k, v in fields.items()
-                                             if v is not None])
-                    dtags = OrderedDict([("loc", loc), ("host", host)] + tags)
-                    for output in outputs:
-                        with error_context():
-                            output.run(driver_id, ts, fields, dtags)
+                if pool is not None:
+                    for sample in pool.samples(extra_inputs, interval):
+                        dispatch(outputs, sample, base_tags, filters)
+                elif use_asyncio:
+                    arun(inputs + extra_inputs, outputs, base_tags,
+                         interval, workers, filters, catch_up)
+                    # Its handlers are removed when the event loop closes
+                    signal.signal(signal.SIGTERM, handle_term)
+                    signal.signal(signal.SIGHUP, handle_reload)
+                else:
+                    for sample in schedule(inputs + extra_inputs, interval,
+                                           workers, catch_up):
+                        dispatch(outputs, sample, base_tags, filters)
+                # Only returns to reload the configuration
+                with error_context():
+                    cfg = _reload_config(cfg_file)
+                    interval = cfg.get("interval", 0)
+                    workers = cfg.get("workers", 1)
+                    use_asyncio = cfg.get("asyncio", False)
+                    catch_up = cfg.get("catch_up", 0)
+                    if pool is None:
+                        inputs_cfg = _setup_pins(
+                            cfg.get("inputs", {}), inputs_cfg)
+                    inputs, filters, new_outputs = drivers.update(
+                        inputs_cfg, cfg.get("filters", {}),
+                        cfg.get("outputs", {}))
+                    # In place, the metrics driver reports their queues
+                    outputs[:] = new_outputs
     except TerminationError:
         print("Piot stopped", file=sys.stderr)
 
 
+def _reload_config(cfg_file):
+    global _RELOAD
+    _RELOAD = False
+    cfg = toml.load(cfg_file)
+    print("Reloading configuration", file=sys.stderr)
+    return cfg
+
+
+def _setup_pins(inputs_cfg, old_inputs_cfg):
+    # Sets up the activation pins new to a reloaded configuration
+    pins = set(find(inputs_cfg, ACT_PIN_ID)) - \
+        set(find(old_inputs_cfg, ACT_PIN_ID))
+    if pins:
+        gpio = _gpio()
+        gpio.setup(sorted(pins), gpio.OUT, initial=gpio.HIGH)
+    return inputs_cfg
+
+
+def _watch(cfg_file, period=1):
+    # Requests a reload whenever the configuration file is modified, through
+    # the same signal as an external one
+    mtime = None
+    while True:
+        try:
+            current = os.stat(cfg_file).st_mtime_ns
+        except OSError:
+            current = mtime
+        if mtime is not None and current != mtime:
+            os.kill(os.getpid(), signal.SIGHUP)
+        mtime = current
+        time.sleep(period)
+
+
 @contextlib.contextmanager
 def gpio_context(cfg):
+    pin_list = list(find(cfg, ACT_PIN_ID))
+    try:
+        gpio = _gpio()
+    except ImportError:
+        # Not needed without activation pins, for instance off a Pi
+        if pin_list:
+            raise
+        yield
+        return
     try:
-        GPIO.setmode(GPIO.BCM)
-        pin_list = list(find(cfg, ACT_PIN_ID))
-        GPIO.setup(pin_list, GPIO.OUT, initial=GPIO.HIGH)
+        gpio.setmode(gpio.BCM)
+        gpio.setup(pin_list, gpio.OUT, initial=gpio.HIGH)
         yield
     finally:
-        GPIO.cleanup()
+        with _PINS_LOCK:
+            _PINS.clear()
+            del _KEPT_PINS[:]
+        gpio.cleanup()
+
+
+class _PinState:
+    __slots__ = ("refs", "on_since", "on_time", "since")
+
+    def __init__(self):
+        self.refs = 0
+        self.on_since = None
+        self.on_time = 0.0
+        self.since = time.monotonic()
+
+
+def power_on(pin):
+    # An activation pin is kept low while anything holds it, be it a run or
+    # the warm-up before one
+    with _PINS_LOCK:
+        state = _PINS.get(pin)
+        if state is None:
+            state = _PINS[pin] = _PinState()
+        if not state.refs:
+            GPIO.output(pin, GPIO.LOW)
+            state.on_since = time.monotonic()
+        state.refs += 1
+
+
+def power_off(pin):
+    with _PINS_LOCK:
+        state = _PINS[pin]
+        state.refs -= 1
+        if not state.refs:
+            GPIO.output(pin, GPIO.HIGH)
+            state.on_time += time.monotonic() - state.on_since
+            state.on_since = None
+
+
+def power_stats(reset=True):
+    # Time every activation pin has been low, and its fraction of the time
+    # since the last reset
+    res = []
+    now = time.monotonic()
+    with _PINS_LOCK:
+        for pin, state in sorted(_PINS.items()):
+            on_time = state.on_time
+            if state.on_since is not None:
+                on_time += now - state.on_since
+            elapsed = now - state.since
+            res.append((pin, OrderedDict([
+                ("on_time", on_time),
+                ("duty_cycle", on_time / elapsed if elapsed > 0 else 0.0),
+            ])))
+            if reset:
+                state.on_time = 0.0
+                state.since = now
+                if state.on_since is not None:
+                    state.on_since = now
+    return res
 
 
 @contextlib.contextmanager
 def activation_context(pin=None):
+    if pin is None:
+        yield
+        return
+    power_on(pin)
     try:
-        if pin is not None:
-            GPIO.output(pin, GPIO.LOW)
         yield
     finally:
-        if pin is not None:
-            GPIO.output(pin, GPIO.HIGH)
+        power_off(pin)
 
 
 @contextlib.contextmanager
@@ -195,9 +1231,19 @@ def error_context(raise_all=False):
 
 
 class DriverBase:
+    # Seconds the device needs powered through its activation pin before it
+    # is read: warmup is set from WARMUP, and WARMUP = true uses the default
+    default_warmup = 0
+    warmup = 0
+
     def run(self):
         raise NotImplementedError()
 
+    async def arun(self):
+        # Blocking drivers run in the default executor
+        return await asyncio.get_event_loop().run_in_executor(
+            None, lambda: list(self.run()))
+
     def close(self):
         pass
 
@@ -210,41 +1256,337 @@ class DriverBase:
     def sid(self):
         return self.__class__.__module__.split(".")[-1]
 
+    def resources(self):
+        return ()
+
+
+def get_busio_i2c():
+    # A single busio.I2C for every Adafruit driver, which lock it themselves
+    global _BUSIO
+    with _BUSES_LOCK:
+        if _BUSIO is None:
+            import board
+            import busio
+            _BUSIO = busio.I2C(board.SCL, board.SDA)
+        return _BUSIO
+
+
+def get_bus(bus=1):
+    # Shared handle of an SMBus, released by closing it
+    with _BUSES_LOCK:
+        shared = _BUSES.get(bus)
+        if shared is None:
+            shared = _BUSES[bus] = SharedBus(bus)
+        shared._refs += 1
+        return shared
+
+
+def bus_stats(reset=True):
+    with _BUSES_LOCK:
+        buses = list(_BUSES.values())
+    return [(shared.bus, shared.stats(reset)) for shared in buses]
+
+
+class SharedBus:
+    # SMBus handle shared by the drivers of a bus, serializing their
+    # transactions and accounting the time the bus is busy
+    def __init__(self, bus):
+        self.bus = bus
+        self._smbus = _smbus(bus)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._refs = 0
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._since = time.perf_counter()
+        self._busy = 0.0
+        self._transactions = 0
+        self._errors = 0
+
+    @contextlib.contextmanager
+    def transaction(self):
+        # Holds the bus for a sequence of operations on a device
+        with self._lock:
+            self._depth += 1
+            t0 = time.perf_counter()
+            try:
+                yield self._smbus
+            except OSError:
+                if self._depth == 1:
+                    self._errors += 1
+                raise
+            finally:
+                self._depth -= 1
+                if not self._depth:
+                    self._busy += time.perf_counter() - t0
+                    self._transactions += 1
+
+    def read_i2c_block_data(self, address, register, length):
+        with self.transaction() as bus:
+            return bus.read_i2c_block_data(address, register, length)
+
+    def write_i2c_block_data(self, address, register, data):
+        with self.transaction() as bus:
+            return bus.write_i2c_block_data(address, register, data)
+
+    def read_byte_data(self, address, register):
+        with self.transaction() as bus:
+            return bus.read_byte_data(address, register)
+
+    def write_byte_data(self, address, register, value):
+        with self.transaction() as bus:
+            return bus.write_byte_data(address, register, value)
+
+    def __getattr__(self, name):
+        # Any other SMBus operation, within a transaction
+        if name.startswith("_"):
+            raise AttributeError(name)
+        attr = getattr(self._smbus, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with self.transaction():
+                return attr(*args, **kwargs)
+        return call
+
+    def read_registers(self, address, registers, length, contiguous=False):
+        # Reads 'length' bytes from each register in a single transaction:
+        # one block read if the device auto-increments over contiguous
+        # registers, otherwise one combined I2C_RDWR with a write and a read
+        # message per register
+        with self.transaction() as bus:
+            if contiguous:
+                data = bus.read_i2c_block_data(
+                    address, registers[0], length * len(registers))
+                return [data[i:i + length]
+                        for i in range(0, len(data), length)]
+            if not hasattr(bus, "i2c_rdwr"):
+                return [bus.read_i2c_block_data(address, register, length)
+                        for register in registers]
+            from smbus2 import i2c_msg
+            msgs = []
+            for register in registers:
+                msgs.append(i2c_msg.write(address, [register]))
+                msgs.append(i2c_msg.read(address, length))
+            bus.i2c_rdwr(*msgs)
+            return [list(msg) for msg in msgs[1::2]]
+
+    def stats(self, reset=True):
+        with self._lock:
+            elapsed = time.perf_counter() - self._since
+            res = OrderedDict([
+                ("transactions", self._transactions),
+                ("errors", self._errors),
+                ("busy", self._busy),
+                ("utilization", self._busy / elapsed if elapsed > 0 else 0.0),
+            ])
+            if reset:
+                self._reset_stats()
+        return res
+
+    def close(self):
+        with _BUSES_LOCK:
+            self._refs -= 1
+            if self._refs > 0:
+                return
+            if _BUSES.get(self.bus) is self:
+                del _BUSES[self.bus]
+        self._smbus.close()
+
+
+class I2CDriver(DriverBase):
+    def __init__(self):
+        super().__init__()
+        self._i2c = get_busio_i2c()
+
+    def resources(self):
+        return (("i2c", 1),)
+
 
 class SMBusDriver(DriverBase):
     def __init__(self, bus=1):
         super().__init__()
-        self._bus = SMBus(bus)
+        self._busnum = bus
+        self._bus = get_bus(bus)
+
+    def resources(self):
+        return (("i2c", self._busnum),)
+
+    async def arun(self):
+        # Register transfers are short, run them in the loop itself
+        return list(self.run())
 
     def close(self):
         if self._bus:
             self._bus.close()
+            self._bus = None
         super().close()
 
 
 class SerialDriver(DriverBase):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, persistent=False, **kwargs):
         super().__init__()
         self._args = args
         self._kwargs = kwargs
+        self._persistent = persistent
+        self._serial = None
 
-    @contextlib.contextmanager
-    def _open_serial(self):
-        serial = Serial(timeout=1, *self._args, **self._kwargs)
+    def close(self):
+        if self._serial is not None:
+            self._serial.close()
+            self._serial = None
+        super().close()
+
+    def resources(self):
+        port = self._kwargs.get("port", self._args[0] if self._args else None)
+        return (("serial", port),)
+
+    def _new_serial(self):
+        serial = _serial(timeout=1, *self._args, **self._kwargs)
         try:
             serial.reset_input_buffer()
             serial.reset_output_buffer()
-            yield serial
-        finally:
+        except Exception:
             serial.close()
+            raise
+        return serial
+
+    @contextlib.contextmanager
+    def _open_serial(self):
+        if self._persistent:
+            # Keep the port open across runs, reopening it only after errors
+            if self._serial is None:
+                self._serial = self._new_serial()
+            try:
+                yield self._serial
+            except Exception:
+                self._serial.close()
+                self._serial = None
+                raise
+        else:
+            serial = self._new_serial()
+            try:
+                yield serial
+            finally:
+                serial.close()
 
     def _cmd(self, serial, cmd, size=0):
+        if self._persistent:
+            serial.reset_input_buffer()
         serial.write(cmd)
         serial.flush()
-        time.sleep(0.1)
+        if not self._persistent:
+            time.sleep(0.1)
         if size > 0:
+            # Waits for the whole response up to the port timeout
             return serial.read(size)
 
+    async def _acmd(self, serial, cmd, size=0):
+        if self._persistent:
+            serial.reset_input_buffer()
+        serial.write(cmd)
+        serial.flush()
+        if size > 0:
+            return await self._aread(serial, size)
+
+    async def _aread(self, serial, size, timeout=1):
+        # Waits for the port to be readable instead of blocking on it
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        res = b""
+        while len(res) < size:
+            available = serial.in_waiting
+            if available:
+                res += serial.read(min(available, size - len(res)))
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            ready = loop.create_future()
+            loop.add_reader(serial.fileno(), lambda: ready.done() or
+                            ready.set_result(None))
+            try:
+                await asyncio.wait_for(ready, remaining)
+            except asyncio.TimeoutError:
+                break
+            finally:
+                loop.remove_reader(serial.fileno())
+        return res
+
+    async def _aread_until(self, serial, expected, timeout=1):
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        res = b""
+        while not res.endswith(expected):
+            c = await self._aread(serial, 1, deadline - loop.time())
+            if not c:
+                break
+            res += c
+        return res
+
+
+class QueuedOutput(DriverBase):
+    # Runs an output in its own thread behind a bounded queue, so that slow
+    # outputs do not delay the collection loop
+    _OVERFLOW_POLICIES = ("block", "drop-oldest", "drop-newest")
+
+    def __init__(self, driver, maxsize=1000, overflow="block"):
+        super().__init__()
+        if overflow not in self._OVERFLOW_POLICIES:
+            raise ValueError("Invalid overflow policy: {}".format(overflow))
+        self._driver = driver
+        self._overflow = overflow
+        self._queue = queue.Queue(maxsize)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._loop)
+        self._thread.start()
+
+    def sid(self):
+        return self._driver.sid()
+
+    def resources(self):
+        return self._driver.resources()
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def run(self, driver_id, ts, fields, tags):
+        item = (driver_id, ts, fields, tags)
+        if self._overflow == "block":
+            self._queue.put(item)
+            return
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            if self._overflow == "drop-oldest":
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    self._queue.put_nowait(item)
+                except queue.Full:
+                    pass
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._driver.close()
+        super().close()
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self._driver.run(*item)
+            except Exception:
+                traceback.print_exc()
+
 
 class TerminationError(Exception):
     pass
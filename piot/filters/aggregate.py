@@ -0,0 +1,166 @@
+from collections import OrderedDict, deque
+import math
+import time
+
+from ..core import DriverBase
+
+
+_STATS = ("mean", "min", "max", "stddev", "count", "last")
+
+
+class _Accumulator:
+    # Running count, mean and sum of squared deviations (Welford)
+    __slots__ = ("n", "mean", "m2", "min", "max", "last")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+
+    def add(self, x):
+        self.last = x
+        if type(x) not in (int, float):
+            return
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        if self.min is None or x < self.min:
+            self.min = x
+        if self.max is None or x > self.max:
+            self.max = x
+
+    def merge(self, other):
+        if other.last is not None:
+            self.last = other.last
+        if not other.n:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        if self.min is None or other.min < self.min:
+            self.min = other.min
+        if self.max is None or other.max > self.max:
+            self.max = other.max
+
+    def stat(self, name):
+        if name == "mean":
+            return self.mean
+        if name == "stddev":
+            return math.sqrt(self.m2 / self.n)
+        if name == "count":
+            return self.n
+        return getattr(self, name)
+
+
+class Driver(DriverBase):
+    # Replaces the samples of each series (driver and tags) with statistics
+    # of their fields over tumbling windows, or sliding ones if step is
+    # smaller than window; windows are aligned to multiples of step, and
+    # emitted with the next sample of any input once they end, or one step
+    # later by wall time, so that late samples still make it in; samples of
+    # a pane already closed are dropped and counted in 'late'
+    def __init__(self, window, step=None, inputs=None, stats=_STATS):
+        super().__init__()
+        self._step_ns = int((step or window) * 1e9)
+        panes, rem = divmod(int(window * 1e9), self._step_ns)
+        if panes < 1 or rem:
+            raise ValueError("window must be a multiple of step")
+        self._panes = panes
+        self._inputs = set(inputs) if inputs is not None else None
+        self._stats = [s for s in stats if s in _STATS]
+        self._series = {}
+        # Oldest current pane of the series, none of them ends before
+        self._oldest = None
+        self.late = 0
+
+    def run(self, sample):
+        # A step of grace before the wall clock closes a pane
+        res = self._expire(time.time_ns() // self._step_ns - 1)
+        driver_id, ts, fields, *tags = sample
+        if not fields or (self._inputs is not None
+                          and driver_id not in self._inputs):
+            return res + [sample]
+        key = (driver_id, tuple(tags))
+        pane = ts // self._step_ns
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = \
+                [pane, OrderedDict(), deque(maxlen=self._panes)]
+            if self._oldest is None or pane < self._oldest:
+                self._oldest = pane
+        elif pane > series[0]:
+            res += self._close(driver_id, tags, series, pane)
+        elif pane < series[0]:
+            # Never merged into a newer pane
+            self.late += 1
+            return res
+        accs = series[1]
+        for k, v in fields.items():
+            if v is None:
+                continue
+            acc = accs.get(k)
+            if acc is None:
+                acc = accs[k] = _Accumulator()
+            acc.add(v)
+        return res
+
+    def flush(self):
+        # Every window with pending samples, even if it has not ended yet
+        res = []
+        for (driver_id, tags), series in self._series.items():
+            res += self._close(driver_id, list(tags), series,
+                               series[0] + self._panes)
+        self._series = {}
+        self._oldest = None
+        return res
+
+    def _expire(self, pane):
+        # Closes the panes of every series that ended before the given one,
+        # and forgets the series left without samples in any window
+        if self._oldest is None or pane <= self._oldest:
+            return []
+        res = []
+        for key, series in list(self._series.items()):
+            if series[0] < pane:
+                res += self._close(key[0], list(key[1]), series, pane)
+                if not series[1] and not any(
+                        accs for _, accs in series[2]):
+                    del self._series[key]
+        self._oldest = min((series[0] for series in self._series.values()),
+                           default=None)
+        return res
+
+    def _close(self, driver_id, tags, series, pane):
+        # Emits every window ending between the closed pane and the new one
+        current, accs, history = series
+        history.append((current, accs))
+        series[0], series[1] = pane, OrderedDict()
+        res = []
+        for end in range(current + 1, min(pane, current + self._panes) + 1):
+            merged = OrderedDict()
+            for idx, paccs in history:
+                if end - self._panes <= idx < end:
+                    for k, acc in paccs.items():
+                        if k not in merged:
+                            merged[k] = _Accumulator()
+                        merged[k].merge(acc)
+            if merged:
+                ts = (end - self._panes) * self._step_ns
+                res.append((driver_id, ts, self._fields(merged), *tags))
+        return res
+
+    def _fields(self, accs):
+        fields = OrderedDict()
+        for k, acc in accs.items():
+            if not acc.n:
+                fields[k] = acc.last
+                continue
+            for stat in self._stats:
+                fields["{}_{}".format(k, stat)] = acc.stat(stat)
+        return fields
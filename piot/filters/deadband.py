@@ -0,0 +1,52 @@
+from collections import OrderedDict
+
+from ..core import DriverBase
+
+
+def _per_field(value):
+    if isinstance(value, dict):
+        return lambda k: value.get(k, 0)
+    return lambda k: value
+
+
+class Driver(DriverBase):
+    # Drops the fields of each series (driver and tags) that have not changed
+    # more than the absolute or relative threshold since they were last sent,
+    # and the whole sample if none has; a field that has not been sent for
+    # 'heartbeat' seconds is sent anyway
+    def __init__(self, absolute=0, relative=0, heartbeat=None, inputs=None):
+        super().__init__()
+        self._absolute = _per_field(absolute)
+        self._relative = _per_field(relative)
+        self._heartbeat_ns = int(heartbeat * 1e9) if heartbeat else None
+        self._inputs = set(inputs) if inputs is not None else None
+        # (driver, tags) -> {field: [last sent timestamp, last sent value]}
+        self._sent = {}
+
+    def run(self, sample):
+        driver_id, ts, fields, *tags = sample
+        if not fields or (self._inputs is not None
+                          and driver_id not in self._inputs):
+            return [sample]
+        sent = self._sent.setdefault((driver_id, tuple(tags)), {})
+        changed = OrderedDict()
+        for k, v in fields.items():
+            if v is None:
+                continue
+            last = sent.get(k)
+            if last is None or self._changed(k, last[1], v) or (
+                    self._heartbeat_ns is not None
+                    and ts - last[0] >= self._heartbeat_ns):
+                sent[k] = [ts, v]
+                changed[k] = v
+        if not changed:
+            return []
+        if len(changed) == len(fields):
+            return [sample]
+        return [(driver_id, ts, changed, *tags)]
+
+    def _changed(self, key, last, value):
+        if type(value) not in (int, float) or type(last) not in (int, float):
+            return value != last
+        threshold = max(self._absolute(key), self._relative(key) * abs(last))
+        return abs(value - last) > threshold
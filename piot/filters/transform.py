@@ -0,0 +1,96 @@
+import ast
+from collections import OrderedDict
+import math
+
+from ..core import DriverBase
+
+
+def dew_point(temperature, humidity):
+    # Magnus formula, in degrees Celsius from relative humidity in %
+    a, b = 17.62, 243.12
+    g = math.log(humidity / 100) + a * temperature / (b + temperature)
+    return b * g / (a - g)
+
+
+def heat_index(temperature, humidity):
+    # NOAA (Rothfusz) regression, in degrees Celsius
+    t = temperature * 9 / 5 + 32
+    hi = 0.5 * (t + 61 + (t - 68) * 1.2 + humidity * 0.094)
+    if (hi + t) / 2 >= 80:
+        hi = -42.379 + 2.04901523 * t + 10.14333127 * humidity \
+            - 0.22475541 * t * humidity - 6.83783e-3 * t * t \
+            - 5.481717e-2 * humidity * humidity \
+            + 1.22874e-3 * t * t * humidity \
+            + 8.5282e-4 * t * humidity * humidity \
+            - 1.99e-6 * t * t * humidity * humidity
+    return (hi - 32) * 5 / 9
+
+
+def magnitude(*components):
+    return math.sqrt(sum(c * c for c in components))
+
+
+_FUNCTIONS = {k: v for k, v in vars(math).items() if callable(v)}
+_FUNCTIONS.update(abs=abs, min=min, max=max, round=round, int=int,
+                  float=float, dew_point=dew_point, heat_index=heat_index,
+                  magnitude=magnitude)
+_CONSTANTS = {"pi": math.pi, "e": math.e}
+_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare,
+          ast.IfExp, ast.Call, ast.Name, ast.Constant, ast.Load,
+          ast.operator, ast.unaryop, ast.boolop, ast.cmpop)
+
+
+class _Fields(ast.NodeTransformer):
+    # Names other than functions and constants are fields of the sample
+    def visit_Name(self, node):
+        if node.id in _FUNCTIONS or node.id in _CONSTANTS:
+            return node
+        return ast.copy_location(ast.Call(
+            func=ast.Name(id="_f", ctx=ast.Load()),
+            args=[ast.Constant(value=node.id)], keywords=[]), node)
+
+
+def _compile(expr):
+    # Compiles expr once into a function of the __getitem__ of the fields of
+    # a sample
+    tree = ast.parse(expr, mode="eval")
+    for node in ast.walk(tree):
+        if not isinstance(node, _NODES) or (
+                isinstance(node, ast.Call) and
+                (not isinstance(node.func, ast.Name) or
+                 node.func.id not in _FUNCTIONS)):
+            raise ValueError("Invalid expression: {}".format(expr))
+    body = _Fields().visit(tree).body
+    func = ast.parse("lambda _f: None", mode="eval")
+    func.body.body = body
+    ast.fix_missing_locations(func)
+    return eval(compile(func, "<transform>", "eval"),
+                dict(_FUNCTIONS, **_CONSTANTS))
+
+
+class Driver(DriverBase):
+    # Sets every field of 'fields' to the result of its expression, in order,
+    # so that an expression can use the fields set by the previous ones; an
+    # expression whose fields are missing or invalid leaves its field as is
+    def __init__(self, fields, drop=(), inputs=None, tags=None):
+        super().__init__()
+        self._exprs = [(k, _compile(v)) for k, v in fields.items()]
+        self._drop = list(drop)
+        self._inputs = set(inputs) if inputs is not None else None
+        self._tags = list(tags.items()) if tags else []
+
+    def run(self, sample):
+        driver_id, ts, fields, *tags = sample
+        if not fields or (self._inputs is not None
+                          and driver_id not in self._inputs) or \
+                any(item not in tags for item in self._tags):
+            return [sample]
+        fields = OrderedDict(fields)
+        for k, func in self._exprs:
+            try:
+                fields[k] = func(fields.__getitem__)
+            except (KeyError, TypeError, ValueError, ArithmeticError):
+                pass
+        for k in self._drop:
+            fields.pop(k, None)
+        return [(driver_id, ts, fields, *tags)]
@@ -1,24 +1,88 @@
-from collections import OrderedDict
+from array import array
+from collections import OrderedDict, deque
+import threading
 import time
 
-from ..core import DriverBase
-import board
-import busio
+from ..core import I2CDriver, Frame
 from adafruit_amg88xx import AMG88XX
 
 
-class Driver(DriverBase):
-    def __init__(self, address=0x69):
+_PIXEL_OFFSET = 0x80
+_PIXEL_TEMP_CONVERSION = 0.25
+_ROWS, _COLS = 8, 8
+_KEYS = ["px{}{}".format(i, j) for j in range(_ROWS) for i in range(_COLS)]
+
+
+class Driver(I2CDriver):
+    def __init__(self, address=0x69, compact=False, continuous=False,
+                 frame_rate=10, buffer_size=100):
         super().__init__()
-        i2c = busio.I2C(board.SCL, board.SDA)
-        self._sensor = AMG88XX(i2c, addr=address)
+        self._sensor = AMG88XX(self._i2c, addr=address)
+        self._compact = compact
+        self._raw = bytearray(2 * _ROWS * _COLS)
+        self._cmd = bytes([_PIXEL_OFFSET])
+        self._zeros = array("f", bytes(4 * _ROWS * _COLS))
+        self._frames = None
+        if continuous:
+            self._period = 1 / frame_rate
+            self._frames = deque(maxlen=buffer_size)
+            self._closed = threading.Event()
+            self._thread = threading.Thread(target=self._capture)
+            self._thread.start()
+
+    def close(self):
+        if self._frames is not None:
+            self._closed.set()
+            self._thread.join()
+        super().close()
 
     def run(self):
+        if self._frames is not None:
+            frames = []
+            while self._frames:
+                ts, temp, frame = self._frames.popleft()
+                frames.append((self.sid(), ts, self._fields(temp, frame)))
+            return frames
+        if self._compact:
+            ts, temp = time.time_ns(), self._sensor.temperature
+            return [(self.sid(), ts, self._fields(temp, self._read_frame()))]
         ts, temp, px = time.time_ns(), \
             self._sensor.temperature, self._sensor.pixels
         data = OrderedDict()
         data["temperature"] = temp
-        for j, row in enumerate(px):
-            for i, val in enumerate(row):
-                data["px{}{}".format(i, j)] = val
+        for key, val in zip(_KEYS, (val for row in px for val in row)):
+            data[key] = val
         return [(self.sid(), ts, data)]
+
+    def _read_frame(self):
+        # Single block read of all the pixels, instead of one per pixel
+        with self._sensor.i2c_device as i2c:
+            i2c.write_then_readinto(self._cmd, self._raw)
+        frame = array("f", self._zeros)
+        raw = self._raw
+        for i in range(_ROWS * _COLS):
+            val = raw[2 * i] | (raw[2 * i + 1] & 0x07) << 8
+            if raw[2 * i + 1] & 0x08:
+                val = -val
+            frame[i] = val * _PIXEL_TEMP_CONVERSION
+        return Frame(frame, (_ROWS, _COLS))
+
+    def _fields(self, temp, frame):
+        if self._compact:
+            return OrderedDict([("temperature", temp), ("pixels", frame)])
+        data = OrderedDict()
+        data["temperature"] = temp
+        for key, val in zip(_KEYS, frame.data):
+            data[key] = val
+        return data
+
+    def _capture(self):
+        deadline = time.monotonic()
+        while not self._closed.is_set():
+            try:
+                ts, temp = time.time_ns(), self._sensor.temperature
+                self._frames.append((ts, temp, self._read_frame()))
+            except OSError:
+                pass
+            deadline += self._period
+            self._closed.wait(max(deadline - time.monotonic(), 0))
@@ -1,7 +1,7 @@
 from collections import OrderedDict, deque
-import json
 import os
 import subprocess as sp
+import sys
 import time
 import threading
 
@@ -9,31 +9,93 @@ from ...core import DriverBase
 
 
 EXE = os.path.join(os.path.dirname(os.path.realpath(__file__)), "bsec_bme680")
+CONFIG = "bsec_iaq.config"
 
 
-def _pipe(fh, q):
-    for line in fh:
-        q.append(json.loads(line.strip(), object_pairs_hook=OrderedDict))
-    fh.close()
-    q.append(None)
+def _parse(line):
+    # The helper prints flat objects of numbers, parsed faster than with json
+    # (which would also reject a "nan")
+    res = OrderedDict()
+    for item in line.strip().strip("{}").split(","):
+        key, value = item.split(":")
+        value = value.strip()
+        res[key.strip().strip('"')] = int(value) \
+            if value.lstrip("-").isdigit() else float(value)
+    return res
 
 
 class Driver(DriverBase):
-    def __init__(self, address=0x77):
-        self._queue = deque(maxlen=1)
-        self._proc = sp.Popen([EXE, str(address)], text=True,
-                              stdout=sp.PIPE, stderr=sp.DEVNULL)
-        self._thread = threading.Thread(target=_pipe,
-                                        args=(self._proc.stdout, self._queue))
+    # Runs the helper in the background, restarting it if it exits; it keeps
+    # its calibration in bsec_iaq.state and reads bsec_iaq.config from its
+    # working directory, state_dir if set
+    def __init__(self, address=0x77, history=False, buffer_size=100,
+                 state_dir=None, restart_delay=5):
+        super().__init__()
+        self._address = address
+        # Lines are stored as read, and only parsed when returned
+        self._queue = deque(maxlen=buffer_size if history else 1)
+        self._state_dir = None
+        if state_dir is not None:
+            self._state_dir = os.path.expanduser(state_dir)
+            os.makedirs(self._state_dir, exist_ok=True)
+            self._link_config()
+        self._restart_delay = restart_delay
+        self._closed = threading.Event()
+        self._proc = self._start()
+        self._thread = threading.Thread(target=self._read)
         self._thread.start()
 
+    def _link_config(self):
+        # The configuration next to the helper, or in the directory it would
+        # run in without state_dir
+        dst = os.path.join(self._state_dir, CONFIG)
+        if os.path.lexists(dst):
+            return
+        for src in (os.path.join(os.path.dirname(EXE), CONFIG),
+                    os.path.abspath(CONFIG)):
+            if os.path.exists(src):
+                os.symlink(src, dst)
+                return
+
+    def _start(self):
+        return sp.Popen([EXE, str(self._address)], text=True,
+                        cwd=self._state_dir, stdout=sp.PIPE,
+                        stderr=sp.DEVNULL)
+
+    def _read(self):
+        while True:
+            for line in self._proc.stdout:
+                self._queue.append((time.time_ns(), line))
+            self._proc.stdout.close()
+            code = self._proc.wait()
+            if self._closed.is_set():
+                return
+            print("{} exited with code {}, restarting".format(
+                self.sid(), code), file=sys.stderr)
+            if self._closed.wait(self._restart_delay):
+                return
+            self._proc = self._start()
+            if self._closed.is_set():
+                self._proc.terminate()
+
     def run(self):
+        entries = []
         try:
-            res = self._queue.popleft()
+            while True:
+                entries.append(self._queue.popleft())
         except IndexError:
-            res = None
-        return [(self.sid(), time.time_ns(), res)]
+            pass
+        res = []
+        for ts, line in entries:
+            try:
+                res.append((self.sid(), ts, _parse(line)))
+            except ValueError:
+                # Cut short when the helper died
+                pass
+        return res or [(self.sid(), time.time_ns(), None)]
 
     def close(self):
+        self._closed.set()
         self._proc.terminate()
         self._thread.join()
+        super().close()
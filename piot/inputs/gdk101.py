@@ -10,6 +10,13 @@ _CMD_READ_MEASUREMENT_TIME    = 0xB1
 _CMD_READ_MEASURING_VALUE_10M = 0xB2
 _CMD_READ_MEASURING_VALUE_1M  = 0xB3
 _CMD_READ_FIRMWARE_VERSION    = 0xB4
+_READ_CMDS = (
+    _CMD_READ_STATUS,
+    _CMD_READ_MEASUREMENT_TIME,
+    _CMD_READ_MEASURING_VALUE_10M,
+    _CMD_READ_MEASURING_VALUE_1M,
+    _CMD_READ_FIRMWARE_VERSION,
+)
 
 
 class Driver(SMBusDriver):
@@ -19,16 +26,9 @@ class Driver(SMBusDriver):
 
     def run(self):
         ts = time.time_ns()
-        status, vibration = self._bus.read_i2c_block_data(
-            self._address, _CMD_READ_STATUS, 2)
-        minutes, seconds = self._bus.read_i2c_block_data(
-            self._address, _CMD_READ_MEASUREMENT_TIME, 2)
-        gint10m, gdec10m = self._bus.read_i2c_block_data(
-            self._address, _CMD_READ_MEASURING_VALUE_10M, 2)
-        gint1m, gdec1m = self._bus.read_i2c_block_data(
-            self._address, _CMD_READ_MEASURING_VALUE_1M, 2)
-        firmm, firms = self._bus.read_i2c_block_data(
-            self._address, _CMD_READ_FIRMWARE_VERSION, 2)
+        (status, vibration), (minutes, seconds), (gint10m, gdec10m), \
+            (gint1m, gdec1m), (firmm, firms) = self._bus.read_registers(
+                self._address, _READ_CMDS, 2)
         return [(self.sid(), ts, OrderedDict([
             ("status", status),
             ("vibration", vibration),
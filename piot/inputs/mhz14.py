@@ -27,25 +27,37 @@ def _check(res):
 
 
 class Driver(SerialDriver):
+    default_warmup = 180
+
     def __init__(self, port, zerocalibrate=False, spancalibrate=False,
-                 autocalibrate=True):
-        super().__init__(port, 9600)
+                 autocalibrate=True, persistent=False):
+        super().__init__(port, 9600, persistent=persistent)
         self.zerocalibrate = zerocalibrate
         self.spancalibrate = spancalibrate
         self.autocalibrate = autocalibrate
         self._configured = False
 
+    def _config_seqs(self):
+        seqs = []
+        if self.zerocalibrate:
+            seqs.append(_CALZERO_SEQ)
+        if self.spancalibrate:
+            seqs.append(_CALSPAN_SEQ)
+        seqs.append(_ABCENABLE_SEQ if self.autocalibrate else _ABCDISABLE_SEQ)
+        return seqs
+
     def _configure(self, serial):
         if self._configured:
             return
-        if self.zerocalibrate:
-            self._cmd(serial, _CALZERO_SEQ, 9)
-            self.zerocalibrated = True
-        if self.spancalibrate:
-            self._cmd(serial, _CALSPAN_SEQ, 9)
-            self.spancalibrated = True
-        self._cmd(serial, _ABCENABLE_SEQ if self.autocalibrate
-                  else _ABCDISABLE_SEQ, 9)
+        for seq in self._config_seqs():
+            self._cmd(serial, seq, 9)
+        self._configured = True
+
+    async def _aconfigure(self, serial):
+        if self._configured:
+            return
+        for seq in self._config_seqs():
+            await self._acmd(serial, seq, 9)
         self._configured = True
 
     def run(self):
@@ -53,6 +65,16 @@ class Driver(SerialDriver):
         with self._open_serial() as serial:
             self._configure(serial)
             res = self._cmd(serial, _REQUEST_SEQ, 9)
+        return self._result(ts, res)
+
+    async def arun(self):
+        ts = time.time_ns()
+        with self._open_serial() as serial:
+            await self._aconfigure(serial)
+            res = await self._acmd(serial, _REQUEST_SEQ, 9)
+        return self._result(ts, res)
+
+    def _result(self, ts, res):
         if res[0:2] != b"\xFF\x86" or _check(res):
             raise SerialException("Incorrect response: {}".format(res.hex()))
         co2, = struct.unpack(">H", res[2:4])
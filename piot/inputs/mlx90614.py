@@ -1,17 +1,14 @@
 from collections import OrderedDict
 import time
 
-from ..core import DriverBase
-import board
-import busio
+from ..core import I2CDriver
 from adafruit_mlx90614 import MLX90614
 
 
-class Driver(DriverBase):
+class Driver(I2CDriver):
     def __init__(self, address=0x5a):
         super().__init__()
-        i2c = busio.I2C(board.SCL, board.SDA)
-        self._sensor = MLX90614(i2c, address=address)
+        self._sensor = MLX90614(self._i2c, address=address)
 
     def run(self):
         return [(self.sid(), time.time_ns(), OrderedDict([
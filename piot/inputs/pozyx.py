@@ -8,6 +8,7 @@ import pypozyx
 class Driver(DriverBase):
     def __init__(self, i2c=False, bus=1, port=None):
         super().__init__()
+        self._resource = ("i2c", bus) if i2c else ("serial", port)
         self._sensor = pypozyx.PozyxI2C(bus) if i2c else \
             pypozyx.PozyxSerial(port or pypozyx.get_first_pozyx_serial_port())
 
@@ -16,6 +17,9 @@ class Driver(DriverBase):
             self._sensor.bus.close()
         super().close()
 
+    def resources(self):
+        return (self._resource,)
+
     def run(self):
         position = pypozyx.Coordinates()
         while position.x == position.y == position.z == 0:
@@ -17,13 +17,22 @@ def _check(res):
 
 
 class Driver(SerialDriver):
-    def __init__(self, port):
-        super().__init__(port, 19200)
+    def __init__(self, port, persistent=False):
+        super().__init__(port, 19200, persistent=persistent)
 
     def run(self):
         ts = time.time_ns()
         with self._open_serial() as serial:
             res = self._cmd(serial, _REQUEST_SEQ, 8)
+        return self._result(ts, res)
+
+    async def arun(self):
+        ts = time.time_ns()
+        with self._open_serial() as serial:
+            res = await self._acmd(serial, _REQUEST_SEQ, 8)
+        return self._result(ts, res)
+
+    def _result(self, ts, res):
         if res[0:3] != b"\x02\x10\x04" or _check(res):
             raise SerialException("Incorrect response: {}".format(res.hex()))
         status, minutes, rint, rdec = res[3:7]
@@ -10,6 +10,7 @@ _PASSIVE_CODES = b"\x02\x01\x01"
 _REQUEST_CODES = b"\x04\x00\x00"
 _SETWORK_CODES = b"\x06\x01\x01"
 _SETCONT_CODES = b"\x08\x01\x00"
+_CONFIG_CODES = [_PASSIVE_CODES, _SETWORK_CODES, _SETCONT_CODES]
 
 
 def _seq(codes, device_id=b"\xFF\xFF"):
@@ -25,23 +26,32 @@ def _check(res):
     return res[-1:] != b"\xAB" or _checksum(res[:-2]) != res[-2]
 
 
+def _check_reply(res, head):
+    if res[0:len(head)] != head or _check(res):
+        raise SerialException("Incorrect response: {}".format(res.hex()))
+
+
 class Driver(SerialDriver):
-    def __init__(self, port):
-        super().__init__(port, 9600)
+    default_warmup = 30
+
+    def __init__(self, port, persistent=False):
+        super().__init__(port, 9600, persistent=persistent)
         self._configured = False
 
     def _configure(self, serial):
         if self._configured:
             return
-        res = self._cmd(serial, _seq(_PASSIVE_CODES), 10)
-        if res[0:3] != b"\xAA\xC5\x02" or _check(res):
-            raise SerialException("Incorrect response: {}".format(res.hex()))
-        res = self._cmd(serial, _seq(_SETWORK_CODES), 10)
-        if res[0:3] != b"\xAA\xC5\x06" or _check(res):
-            raise SerialException("Incorrect response: {}".format(res.hex()))
-        res = self._cmd(serial, _seq(_SETCONT_CODES), 10)
-        if res[0:3] != b"\xAA\xC5\x08" or _check(res):
-            raise SerialException("Incorrect response: {}".format(res.hex()))
+        for codes in _CONFIG_CODES:
+            res = self._cmd(serial, _seq(codes), 10)
+            _check_reply(res, b"\xAA\xC5" + codes[:1])
+        self._configured = True
+
+    async def _aconfigure(self, serial):
+        if self._configured:
+            return
+        for codes in _CONFIG_CODES:
+            res = await self._acmd(serial, _seq(codes), 10)
+            _check_reply(res, b"\xAA\xC5" + codes[:1])
         self._configured = True
 
     def run(self):
@@ -49,8 +59,17 @@ class Driver(SerialDriver):
         with self._open_serial() as serial:
             self._configure(serial)
             res = self._cmd(serial, _seq(_REQUEST_CODES), 10)
-        if res[0:2] != b"\xAA\xC0" or _check(res):
-            return ts, None
+        return self._result(ts, res)
+
+    async def arun(self):
+        ts = time.time_ns()
+        with self._open_serial() as serial:
+            await self._aconfigure(serial)
+            res = await self._acmd(serial, _seq(_REQUEST_CODES), 10)
+        return self._result(ts, res)
+
+    def _result(self, ts, res):
+        _check_reply(res, b"\xAA\xC0")
         pm25, pm10 = [x / 10 for x in struct.unpack("<HH", res[2:6])]
         return [(self.sid(), ts, OrderedDict([
             ("pm25", pm25),
@@ -1,5 +1,6 @@
 from collections import OrderedDict
 import struct
+import threading
 import time
 
 from ..core import SerialDriver
@@ -15,14 +16,44 @@ def _check(res):
 
 
 class Driver(SerialDriver):
-    def __init__(self, port):
-        super().__init__(port, 115200)
+    def __init__(self, port, persistent=False):
+        super().__init__(port, 115200, persistent=persistent)
+        self._latest = None
+        if persistent:
+            # The device streams frames continuously, keep the latest one
+            self._closed = threading.Event()
+            self._thread = threading.Thread(target=self._parse)
+            self._thread.start()
+
+    def close(self):
+        if self._persistent:
+            self._closed.set()
+            self._thread.join()
+        super().close()
 
     def run(self):
+        if self._persistent:
+            # Every frame is returned once, a silent device is an error
+            latest, self._latest = self._latest, None
+            if latest is None:
+                raise SerialException("No frame received")
+            ts, res = latest
+        else:
+            ts = time.time_ns()
+            with self._open_serial() as serial:
+                res = self._read_frame(serial)
+        return self._result(ts, res)
+
+    async def arun(self):
+        if self._persistent:
+            return self.run()
         ts = time.time_ns()
         with self._open_serial() as serial:
-            serial.read_until(b"\x59\x59")
-            res = b"\x59\x59" + serial.read(7)
+            await self._aread_until(serial, b"\x59\x59")
+            res = b"\x59\x59" + await self._aread(serial, 7)
+        return self._result(ts, res)
+
+    def _result(self, ts, res):
         if _check(res):
             raise SerialException("Incorrect response: {}".format(res.hex()))
         distance, strength = struct.unpack("<HH", res[2:6])
@@ -30,3 +61,17 @@ class Driver(SerialDriver):
             ("distance", distance),
             ("strength", strength),
         ]))]
+
+    def _read_frame(self, serial):
+        serial.read_until(b"\x59\x59")
+        return b"\x59\x59" + serial.read(7)
+
+    def _parse(self):
+        while not self._closed.is_set():
+            try:
+                with self._open_serial() as serial:
+                    res = self._read_frame(serial)
+                if len(res) == 9 and not _check(res):
+                    self._latest = (time.time_ns(), res)
+            except (SerialException, OSError):
+                self._closed.wait(1)
@@ -1,17 +1,14 @@
 from collections import OrderedDict
 import time
 
-from ..core import DriverBase
-import board
-import busio
+from ..core import I2CDriver
 from adafruit_tsl2561 import TSL2561
 
 
-class Driver(DriverBase):
+class Driver(I2CDriver):
     def __init__(self, address=0x39, gain=None, integration_time=None):
         super().__init__()
-        i2c = busio.I2C(board.SCL, board.SDA)
-        self._sensor = TSL2561(i2c, address)
+        self._sensor = TSL2561(self._i2c, address)
         if gain:
             self._sensor.gain = gain
         if integration_time:
@@ -1,11 +1,11 @@
+import asyncio
 from collections import OrderedDict
 import contextlib
 import struct
 import sys
 import time
 
-from ..core import SMBusDriver, get_inputs, collect, round_step
-from smbus2 import SMBus
+from ..core import SMBusDriver, get_inputs, collect, acollect, round_step
 
 import RPi.GPIO as GPIO
 
@@ -50,9 +50,7 @@ class Driver(SMBusDriver):
                                 self._polling_interval + self._read_interval)
                             # Inputs
                             if inputs:
-                                self._bus.close()
                                 yield from collect(inputs, self._interval)
-                                self._bus = SMBus(self._busnum)
                             # Self
                             v, p, t, flags, b1v, b2v = self._read()
                             state = OrderedDict([
@@ -76,6 +74,50 @@ class Driver(SMBusDriver):
                         time.sleep(3)
                         break
 
+    async def arun(self):
+        sync_ns = int(self._interval * 1e9)
+        with contextlib.ExitStack() as stack:
+            inputs = get_inputs(self._inputs_cfg, stack)
+            try:
+                for vert in _get_range(self._movement["vert"]):
+                    first = True
+                    for pan in _get_range(self._movement["pan"]):
+                        for tilt in _get_range(self._movement["tilt"]):
+                            await asyncio.sleep(self._polling_interval)
+                            await self._amove(vert, pan, tilt)
+                            if first:
+                                first = False
+                                await asyncio.sleep(self._vert_interval)
+                            await asyncio.sleep(
+                                self._polling_interval + self._read_interval)
+                            # Inputs
+                            if inputs:
+                                async for sample in acollect(inputs,
+                                                             self._interval):
+                                    yield sample
+                            # Self
+                            v, p, t, flags, b1v, b2v = await self._aread()
+                            state = OrderedDict([
+                                ("vert"     , v),
+                                ("pan"      , p),
+                                ("tilt"     , t),
+                                ("flags"    , flags),
+                                ("b1voltage", b1v / 10),
+                                ("b2voltage", b2v / 10),
+                            ])
+                            ts = time.time_ns()
+                            yield self.sid(), round_step(ts, sync_ns), state
+            except ResetError:
+                await self._amove(0, 0, 0, False)
+                await asyncio.sleep(3)
+                while True:
+                    try:
+                        await self._aread()
+                        await asyncio.sleep(self._polling_interval)
+                    except ResetError:
+                        await asyncio.sleep(3)
+                        break
+
     def _move(self, vert, pan, tilt, check_reset=True):
         while True:
             try:
@@ -95,6 +137,26 @@ class Driver(SMBusDriver):
             except OSError:
                 time.sleep(self._polling_interval)
 
+    async def _amove(self, vert, pan, tilt, check_reset=True):
+        while True:
+            try:
+                self._send_move(vert, pan, tilt)
+                await asyncio.sleep(self._polling_interval)
+                cvert, cpan, ctilt, _, _, _ = await self._asend_read(
+                    check_reset)
+                if cvert == vert and cpan == pan and ctilt == tilt:
+                    return
+                await asyncio.sleep(self._polling_interval)
+            except OSError:
+                await asyncio.sleep(self._polling_interval)
+
+    async def _aread(self, check_reset=True):
+        while True:
+            try:
+                return await self._asend_read(check_reset)
+            except OSError:
+                await asyncio.sleep(self._polling_interval)
+
     def _send_move(self, vert, pan, tilt):
         data = struct.pack(">HBB", vert, pan, tilt)
         checksum = (0xFF - (sum(data) & 0xFF) + 1) & 0xFF
@@ -112,6 +174,17 @@ class Driver(SMBusDriver):
                 return struct.unpack(">HBBBBBB", data)[:-1]
             time.sleep(self._polling_interval)
 
+    async def _asend_read(self, check_reset=True):
+        if check_reset and self._reset_pin is not None \
+           and not GPIO.input(self._reset_pin):
+            raise ResetError()
+        while True:
+            data = bytes(self._bus.read_i2c_block_data(
+                self._address, self._CMD_READ, 8))
+            if sum(data) & 0xFF == 0:
+                return struct.unpack(">HBBBBBB", data)[:-1]
+            await asyncio.sleep(self._polling_interval)
+
 
 def _get_range(cfg):
     return range(cfg["start"], cfg["stop"] + 1, cfg["step"])
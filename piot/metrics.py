@@ -0,0 +1,149 @@
+from collections import OrderedDict
+import json
+import os
+import threading
+import time
+
+from .core import METRICS_ID, DriverBase, bus_stats, power_stats
+
+
+__all__ = ["Metrics", "Driver"]
+
+
+MEASUREMENT = METRICS_ID
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+
+class _Stat:
+    __slots__ = ("count", "errors", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * len(BUCKETS)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+
+    def merge(self, other):
+        self.count += other.count
+        self.errors += other.errors
+        self.total += other.total
+        if other.min is not None and (self.min is None or
+                                      other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or
+                                      other.max > self.max):
+            self.max = other.max
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+    def fields(self):
+        fields = OrderedDict([
+            ("count", self.count),
+            ("errors", self.errors),
+            ("sum", self.total),
+        ])
+        if self.count:
+            fields["min"] = self.min
+            fields["max"] = self.max
+        cumulative = 0
+        for bound, n in zip(BUCKETS, self.buckets):
+            cumulative += n
+            fields["le_{}".format(bound)] = cumulative
+        return fields
+
+
+class Metrics:
+    # Durations in seconds and error counts per (stage, id), aggregated
+    # between two snapshots
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = OrderedDict()
+
+    def _stat(self, stage, sid):
+        key = (stage, sid)
+        stat = self._stats.get(key)
+        if stat is None:
+            stat = self._stats[key] = _Stat()
+        return stat
+
+    def observe(self, stage, sid, value):
+        with self._lock:
+            self._stat(stage, sid).observe(value)
+
+    def error(self, stage, sid):
+        with self._lock:
+            self._stat(stage, sid).errors += 1
+
+    def take(self):
+        # Raw stats since the last call, to be merged into another instance
+        # (see shard)
+        with self._lock:
+            stats, self._stats = self._stats, OrderedDict()
+        return stats
+
+    def merge(self, stats):
+        with self._lock:
+            for (stage, sid), stat in stats.items():
+                self._stat(stage, sid).merge(stat)
+
+    def snapshot(self, reset=True):
+        with self._lock:
+            stats = self._stats
+            if reset:
+                self._stats = OrderedDict()
+        return [(stage, sid, stat.fields())
+                for (stage, sid), stat in stats.items()]
+
+
+class Driver(DriverBase):
+    # Internal input emitting the metrics as measurements, and optionally
+    # dumping them to a local file
+    def __init__(self, metrics, outputs=(), file=None):
+        super().__init__()
+        self._metrics = metrics
+        self._outputs = outputs
+        self._file = file
+
+    def sid(self):
+        return MEASUREMENT
+
+    def run(self):
+        ts = time.time_ns()
+        stats = self._metrics.snapshot()
+        for output in self._outputs:
+            if hasattr(output, "depth"):
+                stats.append(("queue", output.sid(), OrderedDict([
+                    ("depth", output.depth()),
+                    ("dropped", output.dropped),
+                ])))
+        for bus, fields in bus_stats():
+            stats.append(("bus", "i2c{}".format(bus), fields))
+        for pin, fields in power_stats():
+            stats.append(("power", "pin{}".format(pin), fields))
+        if self._file:
+            self._dump(ts, stats)
+        return [(MEASUREMENT, ts, fields, ("stage", stage), ("id", sid))
+                for stage, sid, fields in stats]
+
+    def _dump(self, ts, stats):
+        tmp = self._file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "timestamp": ts,
+                "stats": [{"stage": stage, "id": sid, "fields": fields}
+                          for stage, sid, fields in stats],
+            }, f)
+        os.replace(tmp, self._file)
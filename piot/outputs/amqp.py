@@ -1,11 +1,17 @@
 from queue import Queue, Empty, Full
+import threading
+import time
+import traceback
 
-from ..core import DriverBase, format_msg
+from ..core import DriverBase
+from ..wire import get_encoder
 import pika
 
 
 class Driver(DriverBase):
     def __init__(self, exchange, queue, routing_key=None, buffer_maxsize=None,
+                 persistent=False, batch_size=100, linger=1, max_backoff=60,
+                 format="line", compression=None, float32=False,
                  *args, **kwargs):
         super().__init__()
         self._args = args
@@ -13,34 +19,130 @@ class Driver(DriverBase):
         self._exchange = exchange
         self._queue = queue
         self._routing_key = routing_key or queue
-        self._buffer = Queue(buffer_maxsize) \
-            if buffer_maxsize is not None else None
+        self._encoder = get_encoder(format, compression, float32)
+        self._content_type = "application/x-piot-binary" \
+            if format == "binary" else "text/plain"
+        self._buffer = Queue(buffer_maxsize or 0) if persistent else \
+            Queue(buffer_maxsize) if buffer_maxsize is not None else None
         self._declared = False
+        self._thread = None
+        self.dropped = 0
+        if persistent:
+            self._batch_size = batch_size
+            self._linger = linger
+            self._max_backoff = max_backoff
+            self._closed = threading.Event()
+            self._thread = threading.Thread(target=self._loop)
+            self._thread.start()
+
+    def close(self):
+        if self._thread is not None:
+            self._closed.set()
+            self._thread.join()
+        super().close()
+
+    def depth(self):
+        return self._buffer.qsize() if self._buffer is not None else 0
 
     def run(self, driver_id, ts, fields, tags):
         if not fields:
             return
-        msg = format_msg(ts, driver_id, tags, fields)
+        msg = (ts, driver_id, tags, fields)
+        if self._thread is not None:
+            # Persistent mode, the buffer holds the messages in flight
+            try:
+                self._buffer.put_nowait(msg)
+            except Full:
+                self.dropped += 1
+            return
         try:
-            with pika.BlockingConnection(
-                 pika.ConnectionParameters(*self._args, **self._kwargs)) as c:
+            with self._connect() as c:
                 channel = c.channel()
-                self._publish(channel, msg)
+                self._publish(channel, [msg])
                 # Flush buffer
                 if self._buffer is not None:
                     try:
                         while True:
                             msg = self._buffer.get_nowait()
-                            self._publish(channel, msg)
+                            self._publish(channel, [msg])
                     except Empty:
                         pass
         except pika.exceptions.AMQPError:
+            if self._buffer is None:
+                # Let the caller know, for instance a spool
+                raise
             # Add to buffer
-            if self._buffer is not None:
-                try:
-                    self._buffer.put_nowait(msg)
-                except Full:
-                    pass
+            try:
+                self._buffer.put_nowait(msg)
+            except Full:
+                self.dropped += 1
+
+    def _connect(self):
+        return pika.BlockingConnection(
+            pika.ConnectionParameters(*self._args, **self._kwargs))
+
+    def _loop(self):
+        conn, channel = None, None
+        batch = []
+        backoff = 1
+        while True:
+            if not batch and self._closed.is_set() and self._buffer.empty():
+                break
+            batch.extend(self._next_batch(self._batch_size - len(batch)))
+            try:
+                if conn is None:
+                    conn = self._connect()
+                    channel = conn.channel()
+                    channel.confirm_delivery()
+                    self._declared = False
+                if batch:
+                    # A single message with every measurement (one per line in
+                    # line protocol), so that a batch costs a single publisher
+                    # confirm
+                    self._publish(channel, batch)
+                    batch = []
+                else:
+                    conn.process_data_events(0)
+                backoff = 1
+            except Exception as e:
+                # Any failure reconnects, so that the thread never dies
+                if not isinstance(e, pika.exceptions.AMQPError):
+                    traceback.print_exc()
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                conn, channel = None, None
+                if self._closed.is_set():
+                    # Give up on the pending messages
+                    self.dropped += len(batch) + self._buffer.qsize()
+                    break
+                self._closed.wait(backoff)
+                backoff = min(2 * backoff, self._max_backoff)
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _next_batch(self, size, idle=1):
+        # Wait for a first message, then linger for more until the batch is
+        # full or the linger time has passed
+        batch = []
+        deadline = None
+        while len(batch) < size:
+            timeout = idle if deadline is None else deadline - time.monotonic()
+            try:
+                if timeout > 0 and not self._closed.is_set():
+                    batch.append(self._buffer.get(timeout=timeout))
+                else:
+                    batch.append(self._buffer.get_nowait())
+            except Empty:
+                break
+            if deadline is None:
+                deadline = time.monotonic() + self._linger
+        return batch
 
     def _declare(self, channel):
         if not self._declared:
@@ -53,11 +155,12 @@ class Driver(DriverBase):
             )
             self._declared = True
 
-    def _publish(self, channel, msg):
+    def _publish(self, channel, samples):
         self._declare(channel)
         channel.basic_publish(
             exchange=self._exchange,
             routing_key=self._routing_key,
-            body=msg,
-            properties=pika.BasicProperties(delivery_mode=2)
+            body=self._encoder.encode_batch(samples),
+            properties=pika.BasicProperties(
+                delivery_mode=2, content_type=self._content_type)
         )
@@ -1,23 +1,243 @@
+import gzip
+import json
 import os
+import shutil
+import threading
+import time
+import traceback
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
-from ..core import DriverBase, format_msg
+from ..core import DriverBase
+from ..wire import get_encoder
+
+
+_EXTENSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+_INDEX_EXT = ".index"
+
+
+def find_segments(file, start=None, end=None):
+    # Rotated segments of file that may hold samples between start and end
+    # (timestamps in ns), oldest first; requires index = true
+    res = []
+    try:
+        with open(file + _INDEX_EXT) as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry["start"] is not None and (
+                        (end is not None and entry["start"] > end) or
+                        (start is not None and entry["end"] < start)):
+                    continue
+                res.append(os.path.join(os.path.dirname(file),
+                                        entry["file"]))
+    except FileNotFoundError:
+        pass
+    return res
+
+
+def _segment_key(suffix):
+    # Creation time and number of a segment, from its suffix, as in
+    # 20240101T000000-2.gz
+    stamp, _, rest = suffix.partition(".")[0].partition("-")
+    return stamp, int(rest) if rest.isdigit() else 0
 
 
 class Driver(DriverBase):
-    def __init__(self, file="/dev/stdout"):
+    def __init__(self, file="/dev/stdout", format="line", compression=None,
+                 float32=False, buffer_size=1, flush_interval=None,
+                 rotate_size=None, rotate_interval=None,
+                 rotate_compression=None, keep=None, index=False):
         super().__init__()
+        if rotate_compression not in _EXTENSIONS:
+            raise ValueError(
+                "Invalid compression: {}".format(rotate_compression))
+        if rotate_compression == "zstd" and zstandard is None:
+            raise ValueError("zstandard is required for zstd compression")
+        self._file = file
+        self._encoder = get_encoder(format, compression, float32)
+        self._binary = format == "binary"
+        self._buffer_size = buffer_size
+        self._flush_interval = flush_interval
+        self._rotate_size = rotate_size
+        self._rotate_interval = rotate_interval
+        self._rotate_compression = rotate_compression
+        self._keep = keep
+        self._index = index
+        self._pending = []
+        # Monotonic time of the first message of the pending ones
+        self._buffered = None
+        self._archiver = None
+        self._segment = None
+        self._cv = threading.Condition()
+        self._closed = False
+        self._open()
+        if index and (rotate_size or rotate_interval) and self._fd.tell():
+            # Left by a previous run, the time range of its samples is unknown
+            self._rotate()
+        self._timer = None
+        if flush_interval is not None or rotate_interval is not None:
+            # Flushes and rotates on time even if no more messages arrive
+            self._timer = threading.Thread(target=self._loop, daemon=True)
+            self._timer.start()
+
+    def _open(self):
+        mode = "ab" if self._binary else "a"
         try:
-            self._fd = open(file, "a")
+            self._fd = open(self._file, mode)
         except OSError:
-            self._fd = open(file, "w")
+            self._fd = open(self._file, mode.replace("a", "w"))
+        self._opened = time.time()
+        self._range = None
 
     def close(self):
+        with self._cv:
+            self._closed = True
+            self._cv.notify()
+        if self._timer is not None:
+            self._timer.join()
+        self._flush()
         self._fd.close()
+        if self._archiver is not None:
+            self._archiver.join()
         super().close()
 
     def run(self, driver_id, ts, fields, tags):
         if not fields:
             return
-        msg = format_msg(ts, driver_id, tags, fields)
-        self._fd.write(msg + os.linesep)
-        self._fd.flush()
+        with self._cv:
+            self._add(driver_id, ts, fields, tags)
+            self._cv.notify()
+
+    def _add(self, driver_id, ts, fields, tags):
+        if not self._pending:
+            self._buffered = time.monotonic()
+        if self._binary:
+            # Encoded on flush, so that a buffer becomes a single block
+            self._pending.append((ts, driver_id, tags, fields))
+        else:
+            self._pending.append(
+                self._encoder.encode(ts, driver_id, tags, fields) + os.linesep)
+        if self._range is None:
+            self._range = [ts, ts]
+        else:
+            self._range = [min(self._range[0], ts), max(self._range[1], ts)]
+        if len(self._pending) >= self._buffer_size or (
+                self._flush_interval is not None and
+                time.monotonic() - self._buffered >= self._flush_interval):
+            self._flush()
+
+    def _due(self):
+        # Monotonic time of the next flush or rotation, if any is pending
+        due = []
+        if self._pending and self._flush_interval is not None:
+            due.append(self._buffered + self._flush_interval)
+        if self._range is not None and self._rotate_interval is not None:
+            due.append(time.monotonic() + self._opened +
+                       self._rotate_interval - time.time())
+        return min(due) if due else None
+
+    def _loop(self):
+        with self._cv:
+            while not self._closed:
+                due = self._due()
+                now = time.monotonic()
+                if due is None or due > now:
+                    self._cv.wait(due - now if due is not None else None)
+                    continue
+                try:
+                    self._flush()
+                except OSError:
+                    traceback.print_exc()
+                    self._cv.wait(1)
+
+    def _flush(self):
+        if self._pending:
+            if self._binary:
+                self._fd.write(self._encoder.encode_batch(self._pending))
+            else:
+                self._fd.write("".join(self._pending))
+            self._fd.flush()
+            self._pending = []
+        if self._range is None:
+            return
+        if (self._rotate_size is not None and
+                self._fd.tell() >= self._rotate_size) or \
+                (self._rotate_interval is not None and
+                 time.time() - self._opened >= self._rotate_interval):
+            self._rotate()
+
+    def _rotate(self):
+        self._fd.close()
+        base = "{}.{}".format(self._file, time.strftime(
+            "%Y%m%dT%H%M%S", time.gmtime(self._opened)))
+        # Numbered after the previous segment of the same second, even if it
+        # was removed since
+        i = self._segment[1] + 1 \
+            if self._segment and self._segment[0] == base else 0
+        name = "{}-{}".format(base, i) if i else base
+        while any(os.path.exists(name + ext)
+                  for ext in _EXTENSIONS.values()):
+            i += 1
+            name = "{}-{}".format(base, i)
+        os.replace(self._file, name)
+        self._segment = (base, i)
+        ts_range = self._range
+        self._open()
+        # Compression and cleanup of the previous segment off the hot path,
+        # after those of the segments before it
+        self._archiver = threading.Thread(
+            target=self._archive, args=(name, ts_range, self._archiver))
+        self._archiver.start()
+
+    def _archive(self, name, ts_range, previous):
+        if previous is not None:
+            previous.join()
+        try:
+            if self._rotate_compression == "gzip":
+                with open(name, "rb") as src, gzip.open(name + ".gz", "wb") \
+                        as dst:
+                    shutil.copyfileobj(src, dst)
+            elif self._rotate_compression == "zstd":
+                with open(name, "rb") as src, open(name + ".zst", "wb") \
+                        as dst:
+                    zstandard.ZstdCompressor().copy_stream(src, dst)
+            if self._rotate_compression is not None:
+                os.remove(name)
+                name += _EXTENSIONS[self._rotate_compression]
+            if self._index:
+                with open(self._file + _INDEX_EXT, "a") as f:
+                    f.write(json.dumps({
+                        "file": os.path.basename(name),
+                        "start": ts_range[0] if ts_range else None,
+                        "end": ts_range[1] if ts_range else None,
+                    }) + "\n")
+            if self._keep is not None:
+                self._cleanup()
+        except OSError:
+            traceback.print_exc()
+
+    def _cleanup(self):
+        # Removes the oldest segments beyond 'keep', and them from the index;
+        # those still being compressed are not counted
+        dirname = os.path.dirname(self._file) or "."
+        prefix = os.path.basename(self._file) + "."
+        ext = _EXTENSIONS[self._rotate_compression]
+        segments = sorted(
+            (name for name in os.listdir(dirname)
+             if name.startswith(prefix) and name.endswith(ext) and
+             not name.endswith(_INDEX_EXT) and
+             name[len(prefix):len(prefix) + 1].isdigit()),
+            key=lambda name: _segment_key(name[len(prefix):]))
+        removed = segments[:max(len(segments) - self._keep, 0)]
+        for name in removed:
+            os.remove(os.path.join(dirname, name))
+        if self._index and removed:
+            index = self._file + _INDEX_EXT
+            with open(index) as f:
+                lines = [line for line in f
+                         if json.loads(line)["file"] not in removed]
+            with open(index + ".tmp", "w") as f:
+                f.writelines(lines)
+            os.replace(index + ".tmp", index)
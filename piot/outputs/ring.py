@@ -0,0 +1,290 @@
+from collections import OrderedDict
+import hashlib
+import http.server
+import json
+import mmap
+import os
+import socketserver
+import struct
+import threading
+import urllib.parse
+
+from ..core import DriverBase
+
+
+__all__ = ["RingStore", "Driver"]
+
+
+# A file per series (measurement, tags, field and type): a header with the
+# key, then a column of capacity timestamps and one of values
+_MAGIC = b"PRNG"
+_VERSION = 1
+_HEADER = struct.Struct("<4sBc2xQQQI")
+_POSITION = struct.Struct("<QQ")
+_POSITION_OFFSET = 16
+_DATA_OFFSET = 4096
+_EXT = ".ring"
+
+
+def _type(v):
+    t = type(v)
+    if t is float:
+        return "d"
+    if t is int or t is bool:
+        return "q"
+    return None
+
+
+class _Series:
+    def __init__(self, file, key=None, type=None, capacity=None):
+        exists = os.path.exists(file)
+        if not exists:
+            raw = json.dumps(key).encode("utf-8")
+            if _HEADER.size + len(raw) > _DATA_OFFSET:
+                raise ValueError("Series key too long: {}".format(key))
+        fd = os.open(file, os.O_RDWR | os.O_CREAT)
+        try:
+            if not exists:
+                os.ftruncate(fd, _DATA_OFFSET + 16 * capacity)
+            self._mm = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+        if not exists:
+            _HEADER.pack_into(self._mm, 0, _MAGIC, _VERSION, type.encode(),
+                              capacity, 0, 0, len(raw))
+            self._mm[_HEADER.size:_HEADER.size + len(raw)] = raw
+        magic, version, type, capacity, self.head, self.count, size = \
+            _HEADER.unpack_from(self._mm)
+        if magic != _MAGIC or version != _VERSION:
+            self._mm.close()
+            raise ValueError("Invalid ring file: {}".format(file))
+        self.type = type.decode()
+        self.capacity = capacity
+        self.key = json.loads(
+            bytes(self._mm[_HEADER.size:_HEADER.size + size]).decode("utf-8"))
+        # Views of the columns, read in place by the queries
+        view = memoryview(self._mm)
+        end = _DATA_OFFSET + 8 * capacity
+        self.ts = view[_DATA_OFFSET:end].cast("q")
+        self.values = view[end:end + 8 * capacity].cast(self.type)
+
+    def close(self):
+        self.ts.release()
+        self.values.release()
+        self._mm.close()
+
+    def append(self, ts, value):
+        self.ts[self.head] = ts
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        # The position is only updated once the values are in place
+        _POSITION.pack_into(self._mm, _POSITION_OFFSET, self.head, self.count)
+
+    def _bisect(self, ts, head, count):
+        # Position of the first entry (oldest first) at or after ts
+        lo, hi = 0, count
+        first = head - count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ts[(first + mid) % self.capacity] < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def range(self, start=None, end=None, last=None, position=None):
+        # Entries up to the given (head, count), read in place while new ones
+        # are appended, which only overwrite the oldest
+        head, count = position or (self.head, self.count)
+        lo = 0 if start is None else self._bisect(start, head, count)
+        hi = count if end is None else self._bisect(end + 1, head, count)
+        if last is not None:
+            lo = max(lo, hi - last)
+        first = head - count
+        for i in range(lo, hi):
+            j = (first + i) % self.capacity
+            yield self.ts[j], self.values[j]
+
+
+def _downsample(entries, step):
+    # Mean of the values in every step (ns), timestamped with its start
+    bucket = total = n = None
+    for ts, v in entries:
+        b = ts // step * step
+        if b != bucket:
+            if n:
+                yield bucket, total / n
+            bucket, total, n = b, 0, 0
+        total += v
+        n += 1
+    if n:
+        yield bucket, total / n
+
+
+class RingStore:
+    # Fixed-size rings of the numeric fields of every series, in memory-mapped
+    # files under path; RAM use is bounded by the page cache
+    def __init__(self, path, capacity=86400):
+        self._path = os.path.expanduser(path)
+        self._capacity = capacity
+        self._series = {}
+        self._lock = threading.Lock()
+        os.makedirs(self._path, exist_ok=True)
+        for name in sorted(os.listdir(self._path)):
+            if name.endswith(_EXT):
+                series = _Series(os.path.join(self._path, name))
+                self._series[self._key(*series.key)] = series
+
+    def _key(self, measurement, tags, field, type):
+        # Tag values as strings, the way queries compare them
+        return (measurement, tuple((k, str(v)) for k, v in tags), field,
+                type)
+
+    def close(self):
+        with self._lock:
+            for series in self._series.values():
+                series.close()
+            self._series = {}
+
+    def append(self, measurement, ts, tags, fields):
+        tags = [[k, v] for k, v in tags.items()]
+        with self._lock:
+            for field, value in fields.items():
+                type = _type(value)
+                if type is None:
+                    continue
+                key = self._key(measurement, tags, field, type)
+                series = self._series.get(key)
+                if series is None:
+                    jkey = [measurement, tags, field, type]
+                    name = hashlib.sha1(json.dumps(jkey).encode("utf-8")) \
+                        .hexdigest() + _EXT
+                    series = self._series[key] = _Series(
+                        os.path.join(self._path, name), jkey, type,
+                        self._capacity)
+                series.append(ts, value)
+
+    def _match(self, measurement, field, tags):
+        for key, series in self._series.items():
+            if (measurement is None or key[0] == measurement) and \
+                    (field is None or key[2] == field) and \
+                    (not tags or all((k, str(v)) in key[1]
+                                     for k, v in tags.items())):
+                yield key, series
+
+    def series(self, measurement=None, field=None, tags=None):
+        with self._lock:
+            return [self._describe(key, series) for key, series in
+                    self._match(measurement, field, tags)]
+
+    def _describe(self, key, series):
+        measurement, _, field, _ = key
+        return OrderedDict([
+            ("measurement", measurement),
+            ("tags", OrderedDict(map(tuple, series.key[1]))),
+            ("field", field),
+            ("count", series.count),
+        ])
+
+    def query(self, measurement=None, field=None, tags=None, start=None,
+              end=None, last=None, step=None):
+        # Entries of the matching series between start and end (ns), only the
+        # last ones if given, and averaged over every step (ns) if given
+        # The positions are taken under the lock, and the entries read
+        # without it, so that appends are not blocked
+        with self._lock:
+            matches = [(key, series, (series.head, series.count))
+                       for key, series in self._match(measurement, field,
+                                                      tags)]
+        res = []
+        for key, series, position in matches:
+            entries = series.range(start, end, last, position)
+            if step:
+                entries = _downsample(entries, step)
+            entry = self._describe(key, series)
+            entry["ts"], entry["values"] = [], []
+            for ts, v in entries:
+                entry["ts"].append(ts)
+                entry["values"].append(v)
+            del entry["count"]
+            res.append(entry)
+        return res
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    # GET /series or /query, filtered by measurement, field and tag.<name>
+    # and, for queries, with start, end, last and step
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        tags = {k[4:]: v for k, v in params.items() if k.startswith("tag.")}
+        try:
+            args = (params.get("measurement"), params.get("field"), tags)
+            if url.path == "/series":
+                res = self.server.store.series(*args)
+            elif url.path == "/query":
+                res = self.server.store.query(*args, *[
+                    int(params[k]) if k in params else None
+                    for k in ("start", "end", "last", "step")])
+            else:
+                self.send_error(404)
+                return
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        body = json.dumps(res).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        return str(self.client_address)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn,
+                      socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _serve(store, listen):
+    # listen is a Unix socket path or host:port
+    if listen.startswith("/"):
+        if os.path.exists(listen):
+            os.remove(listen)
+        server = _UnixHTTPServer(listen, _Handler)
+    else:
+        host, _, port = listen.rpartition(":")
+        server = http.server.ThreadingHTTPServer(
+            (host or "127.0.0.1", int(port)), _Handler)
+    server.store = store
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Driver(DriverBase):
+    def __init__(self, path="/var/lib/piot/ring", capacity=86400,
+                 listen=None):
+        super().__init__()
+        self._store = RingStore(path, capacity)
+        self._listen = listen
+        self._server = _serve(self._store, listen) if listen else None
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            if self._listen.startswith("/"):
+                os.remove(self._listen)
+        self._store.close()
+        super().close()
+
+    def run(self, driver_id, ts, fields, tags):
+        if not fields:
+            return
+        self._store.append(driver_id, ts, tags, fields)
@@ -2,60 +2,144 @@ import datetime
 import os
 import socket
 import subprocess
+import threading
+import time
 
-from ..core import DriverBase, TAG_ERROR
-import board
-import busio
+from ..core import DriverBase, TAG_ERROR, get_busio_i2c
 from adafruit_ssd1306 import SSD1306_I2C
 
 
-class Driver(DriverBase):
+_FONT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "font5x8.bin")
+_SET_COL_ADDR, _SET_PAGE_ADDR = 0x21, 0x22
+_COLS = 6
+
 
-    def __init__(self, width, height, addr=0x3C, reset=None):
+class Driver(DriverBase):
+    # Every text row is a display page (8 pixels high), so only the pages
+    # whose contents changed are drawn and sent
+    def __init__(self, width, height, addr=0x3C, reset=None, max_rate=2,
+                 info_ttl=60, page_interval=5):
         super().__init__()
-        i2c = busio.I2C(board.SCL, board.SDA)
-        self._disp = SSD1306_I2C(width, height, i2c, addr=addr, reset=reset)
+        # Shared with the Adafruit inputs on the same bus
+        self._disp = SSD1306_I2C(width, height, get_busio_i2c(), addr=addr,
+                                 reset=reset)
         self._buffer = {}
+        self._min_period = 1 / max_rate
+        self._info_ttl = info_ttl
+        self._page_interval = page_interval
+        self._info = None
+        self._info_time = None
+        self._rows = [None] * (height // 8)
+        self._rendered = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+        super().close()
 
     def run(self, driver_id, ts, fields, tags):
         ltags = [v for k, v in tags.items() if k != TAG_ERROR]
         if not fields:
             if TAG_ERROR in tags:
                 # Error
-                self._buffer[(driver_id, *ltags)] = False
+                ok = False
             else:
                 # Sensor without output, discard
                 return
         else:
             # Valid result
-            self._buffer[(driver_id, *ltags)] = True
+            ok = True
 
-        # Retrieve values
-        timestr = datetime.datetime.now().strftime("%m-%d %H:%M:%S")
-        try:
-            ssid = subprocess.check_output(["/sbin/iwgetid", "-r"]) \
+        with self._lock:
+            self._buffer[(driver_id, *ltags)] = ok
+            if self._timer is not None:
+                return
+            # Updates closer than the minimum period are coalesced
+            delay = 0 if self._rendered is None else \
+                self._rendered + self._min_period - time.monotonic()
+            if delay > 0:
+                self._timer = threading.Timer(delay, self._deferred)
+                self._timer.daemon = True
+                self._timer.start()
+                return
+            self._render()
+
+    def _deferred(self):
+        with self._lock:
+            self._timer = None
+            self._render()
+
+    def _host_info(self):
+        now = time.monotonic()
+        if self._info is None or now - self._info_time >= self._info_ttl:
+            try:
+                ssid = subprocess.check_output(["/sbin/iwgetid", "-r"]) \
+                    .decode("utf-8").strip()
+            except Exception:
+                ssid = "---"
+            devip = subprocess.check_output(["hostname", "-I"]) \
                 .decode("utf-8").strip()
-        except Exception:
-            ssid = "---"
-        devid = socket.gethostname()
-        devip = subprocess.check_output(["hostname", "-I"]) \
-            .decode("utf-8").strip()
+            self._info = (socket.gethostname(), ssid, devip)
+            self._info_time = now
+        return self._info
 
-        # Show values
-        font_name = os.path.join(
-            os.path.dirname(os.path.abspath(__file__)), "font5x8.bin")
+    def _render(self):
+        # Retrieve values
+        devid, ssid, devip = self._host_info()
+        timestr = datetime.datetime.now().strftime("%m-%d %H:%M:%S")
         cw = 21
         idcw = cw - len(devip)
-        self._disp.fill(0)
-        self._disp.text(f"{devid[:6]:<6}|{timestr}", 1, 0, 0xFF,
-                        font_name=font_name)
-        self._disp.text(f"{ssid[:idcw - 1] + ':':<{idcw}}{devip}", 0, 8, 0xFF,
-                        font_name=font_name)
-        for i, ((did, *_), ok) in enumerate(self._buffer.items()):
-            y = 16 + 8 * (i // 6)
-            ix = i % 6
-            self._disp.text(did[:3], 1 + 21 * ix, y, 0xFF,
-                            font_name=font_name)
-            for yi in [5, 6, 7] if ok else [7]:
-                self._disp.pixel(19 + 21 * ix, y + yi, 0xFF)
-        self._disp.show()
+        rows = [f"{devid[:6]:<6}|{timestr}",
+                f"{ssid[:idcw - 1] + ':':<{idcw}}{devip}"]
+        items = [(did[:3], ok) for (did, *_), ok in self._buffer.items()]
+        nrows = max(len(self._rows) - 2, 0)
+        per_page = nrows * _COLS
+        if per_page and len(items) > per_page:
+            # Cycle through the devices that do not fit on the screen
+            npages = -(-len(items) // per_page)
+            page = int(time.monotonic() / self._page_interval) % npages
+            items = items[page * per_page:(page + 1) * per_page]
+        rows += [tuple(items[i * _COLS:(i + 1) * _COLS])
+                 for i in range(nrows)]
+
+        # Show values
+        dirty = []
+        for i, row in enumerate(rows[:len(self._rows)]):
+            if row == self._rows[i]:
+                continue
+            self._rows[i] = row
+            dirty.append(i)
+            y = 8 * i
+            self._disp.fill_rect(0, y, self._disp.width, 8, 0)
+            if i < 2:
+                self._disp.text(row, 1 - i, y, 0xFF, font_name=_FONT)
+                continue
+            for ix, (did, ok) in enumerate(row):
+                self._disp.text(did, 1 + 21 * ix, y, 0xFF, font_name=_FONT)
+                for yi in [5, 6, 7] if ok else [7]:
+                    self._disp.pixel(19 + 21 * ix, y + yi, 0xFF)
+        if dirty:
+            self._show(dirty)
+        self._rendered = time.monotonic()
+
+    def _show(self, pages):
+        # Like SSD1306_I2C.show, for each run of consecutive pages only
+        disp = self._disp
+        width = disp.width
+        xpos0 = (128 - width) // 2 if width != 128 else 0
+        runs = []
+        for page in pages:
+            if runs and runs[-1][1] == page - 1:
+                runs[-1][1] = page
+            else:
+                runs.append([page, page])
+        for first, last in runs:
+            for cmd in (_SET_COL_ADDR, xpos0, xpos0 + width - 1,
+                        _SET_PAGE_ADDR, first, last):
+                disp.write_cmd(cmd)
+            data = disp.buffer[1 + first * width:1 + (last + 1) * width]
+            with disp.i2c_device:
+                disp.i2c_device.write(b"\x40" + data)
@@ -0,0 +1,180 @@
+from collections import OrderedDict
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+import toml
+
+from . import core
+from .core import ACT_PIN_ID, DriverSet, TerminationError, error_context, \
+    gpio_context, request_reload, schedule, terminate
+from .metrics import Metrics
+
+
+__all__ = ["split_inputs", "ShardPool"]
+
+
+# Queue items with the metrics of a worker, instead of a driver id
+_METRICS_ITEM = None
+_METRICS_PERIOD = 1
+
+
+def _shard_key(dcfg):
+    # Entries sharing an activation pin or a serial port must run in the same
+    # process, to keep them from running at the same time
+    pin = dcfg.get(ACT_PIN_ID)
+    if pin is not None:
+        return (ACT_PIN_ID, pin)
+    port = dcfg.get("port")
+    if port is not None:
+        return ("port", port)
+    return None
+
+
+def split_inputs(cfg, n):
+    # Splits an inputs configuration into n with about the same number of
+    # entries each; the same configuration is always split the same way
+    groups = OrderedDict()
+    for driver_id in cfg:
+        for dcfg in cfg[driver_id]:
+            key = _shard_key(dcfg) or ("entry", len(groups))
+            groups.setdefault(key, []).append((driver_id, dcfg))
+    shards = [OrderedDict() for _ in range(n)]
+    sizes = [0] * n
+    for entries in sorted(groups.values(), key=len, reverse=True):
+        i = sizes.index(min(sizes))
+        sizes[i] += len(entries)
+        for driver_id, dcfg in entries:
+            shards[i].setdefault(driver_id, []).append(dcfg)
+    return shards
+
+
+def _worker(index, n, cfg_file, samples):
+    # Collection loop of a shard, reloading it on SIGHUP like the main one;
+    # started (or restarted) with the current configuration
+    if core._METRICS is not None:
+        # Its own, sent to the main process periodically
+        core._METRICS = Metrics()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: terminate())
+    signal.signal(signal.SIGHUP, lambda signum, frame: request_reload())
+    cfg = toml.load(cfg_file)
+    interval = cfg.get("interval", 0)
+    workers = cfg.get("workers", 1)
+    catch_up = cfg.get("catch_up", 0)
+    inputs_cfg = split_inputs(cfg.get("inputs", {}), n)[index]
+    sent = time.monotonic()
+    try:
+        with gpio_context(inputs_cfg), DriverSet(workers) as drivers:
+            inputs = drivers.update(inputs_cfg, {}, {})[0]
+            while True:
+                for sample in schedule(inputs, interval, workers, catch_up):
+                    samples.put(sample)
+                    if core._METRICS is not None and \
+                            time.monotonic() - sent >= _METRICS_PERIOD:
+                        sent = time.monotonic()
+                        samples.put((_METRICS_ITEM, core._METRICS.take()))
+                with error_context():
+                    cfg = core._reload_config(cfg_file)
+                    interval = cfg.get("interval", 0)
+                    workers = cfg.get("workers", 1)
+                    catch_up = cfg.get("catch_up", 0)
+                    inputs_cfg = core._setup_pins(split_inputs(
+                        cfg.get("inputs", {}), n)[index], inputs_cfg)
+                    inputs = drivers.update(inputs_cfg, {}, {})[0]
+    except TerminationError:
+        pass
+
+
+class ShardPool:
+    # Worker processes collecting a shard of the inputs each, whose samples
+    # are sent to this one through a queue
+    def __init__(self, cfg_file, n, stop_timeout=10):
+        self._cfg_file = cfg_file
+        self._n = n
+        self._stop_timeout = stop_timeout
+        self._context = multiprocessing.get_context("fork")
+        self._queue = self._context.Queue()
+        self._procs = [self._start(i) for i in range(n)]
+
+    def _start(self, index):
+        proc = self._context.Process(
+            target=_worker, name="piot-shard-{}".format(index),
+            args=(index, self._n, self._cfg_file, self._queue),
+            daemon=True)
+        proc.start()
+        return proc
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def samples(self, inputs=(), interval=0, poll_interval=0.5):
+        # Samples of every shard and of the local inputs, until a reload is
+        # requested, which is forwarded to the workers
+        local = None
+        if inputs:
+            local = threading.Thread(target=self._run_local,
+                                     args=(inputs, interval))
+            local.start()
+        try:
+            # The workers are checked every poll_interval, even while
+            # samples keep arriving
+            checked = time.monotonic()
+            while not core._RELOAD:
+                try:
+                    item = self._queue.get(timeout=poll_interval)
+                except queue.Empty:
+                    pass
+                else:
+                    if item[0] is not _METRICS_ITEM:
+                        yield item
+                    elif core._METRICS is not None:
+                        core._METRICS.merge(item[1])
+                if time.monotonic() - checked >= poll_interval:
+                    checked = time.monotonic()
+                    self._restart_dead()
+                if core._TERMINATED:
+                    raise TerminationError()
+            for proc in self._procs:
+                os.kill(proc.pid, signal.SIGHUP)
+        finally:
+            if local is not None:
+                local.join()
+
+    def _run_local(self, inputs, interval):
+        try:
+            for sample in schedule(inputs, interval):
+                self._queue.put(sample)
+        except TerminationError:
+            pass
+
+    def _restart_dead(self):
+        for i, proc in enumerate(self._procs):
+            if proc.exitcode is not None and not core._TERMINATED:
+                print("Shard {} exited with code {}, restarting".format(
+                    i, proc.exitcode), file=sys.stderr)
+                self._procs[i] = self._start(i)
+
+    def close(self):
+        for proc in self._procs:
+            if proc.is_alive():
+                proc.terminate()
+        # The workers only exit once their queued samples are read
+        deadline = time.monotonic() + self._stop_timeout
+        while any(proc.is_alive() for proc in self._procs) and \
+                time.monotonic() < deadline:
+            try:
+                self._queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        for proc in self._procs:
+            if proc.is_alive():
+                proc.kill()
+            proc.join()
+        self._queue.close()
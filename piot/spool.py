@@ -0,0 +1,288 @@
+from collections import OrderedDict
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import traceback
+
+from .core import DriverBase, Frame
+
+
+__all__ = ["Spool", "SpooledOutput"]
+
+
+_RECORD = struct.Struct("<I")
+_CURSOR = struct.Struct("<QQ")
+_SEGMENT_EXT = ".seg"
+_CURSOR_FILE = "cursor"
+_FRAME_KEY = "$frame"
+_DEAD_FILE = "dead"
+
+
+class Spool:
+    # Append-only store of records split into numbered segment files, with a
+    # durable cursor pointing at the first record not yet delivered
+    def __init__(self, path, segment_size=1 << 20, max_size=64 << 20,
+                 fsync="interval", fsync_interval=1, chunk_size=1 << 16):
+        if fsync not in ("always", "interval", "never"):
+            raise ValueError("Invalid fsync policy: {}".format(fsync))
+        os.makedirs(path, exist_ok=True)
+        self._path = path
+        self._segment_size = segment_size
+        self._max_size = max_size
+        self._fsync = fsync
+        self._fsync_interval = fsync_interval
+        self._chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._cv = threading.Condition(self._lock)
+        self._sizes = OrderedDict(
+            (seg, os.path.getsize(self._segment_path(seg)))
+            for seg in sorted(int(name[:-len(_SEGMENT_EXT)])
+                              for name in os.listdir(path)
+                              if name.endswith(_SEGMENT_EXT)))
+        self._cursor_fd = os.open(os.path.join(path, _CURSOR_FILE),
+                                  os.O_RDWR | os.O_CREAT, 0o644)
+        data = os.pread(self._cursor_fd, _CURSOR.size, 0)
+        if len(data) == _CURSOR.size:
+            self._cursor = _CURSOR.unpack(data)
+        else:
+            self._cursor = (next(iter(self._sizes), 0), 0)
+        self._read_seg, self._read_fd = None, None
+        self._last_sync = time.monotonic()
+        # Never append after a possibly truncated record, start a new segment
+        self._write_seg = max(list(self._sizes) + [self._cursor[0] - 1]) + 1
+        self._write_fd = None
+        with self._lock:
+            self._roll()
+            if self._cursor[0] not in self._sizes:
+                self._set_cursor((next(s for s in self._sizes
+                                       if s >= self._cursor[0]), 0))
+            self._evict()
+
+    def _segment_path(self, seg):
+        return os.path.join(self._path, "{:016d}{}".format(seg, _SEGMENT_EXT))
+
+    def _roll(self):
+        if self._write_fd is not None:
+            if self._fsync != "never":
+                os.fsync(self._write_fd)
+            os.close(self._write_fd)
+            self._write_seg += 1
+        self._write_fd = os.open(self._segment_path(self._write_seg),
+                                 os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._sizes[self._write_seg] = 0
+
+    def _evict(self):
+        while sum(self._sizes.values()) > self._max_size \
+                and len(self._sizes) > 1:
+            seg, _ = self._sizes.popitem(last=False)
+            self._remove(seg)
+            if self._cursor[0] <= seg:
+                self._set_cursor((next(iter(self._sizes)), 0))
+        # Segments already delivered
+        for seg in [s for s in self._sizes if s < self._cursor[0]]:
+            del self._sizes[seg]
+            self._remove(seg)
+
+    def _remove(self, seg):
+        if seg == self._read_seg:
+            os.close(self._read_fd)
+            self._read_seg, self._read_fd = None, None
+        try:
+            os.remove(self._segment_path(seg))
+        except FileNotFoundError:
+            pass
+
+    def _set_cursor(self, cursor):
+        self._cursor = cursor
+        os.pwrite(self._cursor_fd, _CURSOR.pack(*cursor), 0)
+        if self._fsync == "always":
+            os.fsync(self._cursor_fd)
+
+    def _maybe_sync(self):
+        now = time.monotonic()
+        if self._fsync == "always" or (
+                self._fsync == "interval"
+                and now - self._last_sync >= self._fsync_interval):
+            os.fsync(self._write_fd)
+            os.fsync(self._cursor_fd)
+            self._last_sync = now
+
+    def append(self, data):
+        with self._lock:
+            os.write(self._write_fd, _RECORD.pack(len(data)) + data)
+            self._sizes[self._write_seg] += _RECORD.size + len(data)
+            self._maybe_sync()
+            if self._sizes[self._write_seg] >= self._segment_size:
+                self._roll()
+                self._evict()
+            self._cv.notify_all()
+
+    def wait(self, timeout=None):
+        with self._lock:
+            if not self._pending():
+                self._cv.wait(timeout)
+
+    def _pending(self):
+        seg, off = self._cursor
+        return seg < self._write_seg or off < self._sizes[self._write_seg]
+
+    def read(self, max_records):
+        # Returns up to max_records pending records, each with the cursor
+        # position to commit once it has been delivered
+        with self._lock:
+            records = []
+            seg, off = self._cursor
+            while len(records) < max_records:
+                if seg != self._read_seg:
+                    if self._read_fd is not None:
+                        os.close(self._read_fd)
+                    self._read_fd = os.open(self._segment_path(seg),
+                                            os.O_RDONLY)
+                    self._read_seg = seg
+                data = os.pread(self._read_fd, self._chunk_size, off)
+                eof = len(data) < self._chunk_size
+                pos = 0
+                while len(records) < max_records \
+                        and pos + _RECORD.size <= len(data):
+                    size, = _RECORD.unpack_from(data, pos)
+                    end = pos + _RECORD.size + size
+                    if end > len(data):
+                        if pos == 0 and not eof:
+                            # Record larger than a chunk
+                            data = os.pread(self._read_fd, end, off)
+                            eof = len(data) < end
+                            if not eof:
+                                continue
+                        break
+                    records.append((data[pos + _RECORD.size:end],
+                                    (seg, off + end)))
+                    pos = end
+                off += pos
+                if len(records) >= max_records or not eof:
+                    continue
+                # End of segment, any remaining bytes are a truncated record
+                if seg == self._write_seg:
+                    break
+                seg, off = next(s for s in self._sizes if s > seg), 0
+                if not records:
+                    self._set_cursor((seg, off))
+                    self._evict()
+                    seg, off = self._cursor
+            return records
+
+    def commit(self, cursor):
+        with self._lock:
+            # Ignore positions in segments evicted in the meantime
+            if cursor > self._cursor:
+                self._set_cursor(cursor)
+                if cursor[0] != next(iter(self._sizes)):
+                    self._evict()
+
+    def close(self):
+        with self._lock:
+            if self._fsync != "never":
+                os.fsync(self._write_fd)
+                os.fsync(self._cursor_fd)
+            os.close(self._write_fd)
+            os.close(self._cursor_fd)
+            if self._read_fd is not None:
+                os.close(self._read_fd)
+
+
+def _encode(value):
+    # Frames are stored as tagged objects with their string form
+    if isinstance(value, Frame):
+        return {_FRAME_KEY: str(value)}
+    raise TypeError("Object of type {} is not JSON serializable".format(
+        type(value).__name__))
+
+
+def _decode(pairs):
+    if len(pairs) == 1 and pairs[0][0] == _FRAME_KEY:
+        return Frame.fromstring(pairs[0][1])
+    return OrderedDict(pairs)
+
+
+class SpooledOutput(DriverBase):
+    # Stores every message on disk and delivers it to the wrapped output
+    # from a separate thread, retrying with backoff while the output fails;
+    # after max_retries failures a message is moved to the dead file of the
+    # spool, as are the records that cannot be decoded
+    def __init__(self, driver, path, bulk_size=100, max_backoff=60,
+                 max_retries=None, **kwargs):
+        super().__init__()
+        self._driver = driver
+        self._spool = Spool(path, **kwargs)
+        self._dead = os.path.join(path, _DEAD_FILE)
+        self._bulk_size = bulk_size
+        self._max_backoff = max_backoff
+        self._max_retries = max_retries
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._loop)
+        self._thread.start()
+
+    def sid(self):
+        return self._driver.sid()
+
+    def resources(self):
+        return self._driver.resources()
+
+    def run(self, driver_id, ts, fields, tags):
+        self._spool.append(json.dumps(
+            [driver_id, ts, fields, tags], separators=(",", ":"),
+            default=_encode).encode("utf-8"))
+
+    def close(self):
+        self._closed.set()
+        self._thread.join()
+        self._spool.close()
+        self._driver.close()
+        super().close()
+
+    def _loop(self):
+        backoff = 1
+        failures = 0
+        while not self._closed.is_set():
+            records = self._spool.read(self._bulk_size)
+            if not records:
+                self._spool.wait(1)
+                continue
+            for data, cursor in records:
+                try:
+                    driver_id, ts, fields, tags = json.loads(
+                        data.decode("utf-8"), object_pairs_hook=_decode)
+                except Exception:
+                    traceback.print_exc()
+                    self._bury(data, cursor)
+                    continue
+                try:
+                    self._driver.run(driver_id, ts, fields, tags)
+                except Exception:
+                    traceback.print_exc()
+                    failures += 1
+                    if self._max_retries is not None and \
+                            failures > self._max_retries:
+                        self._bury(data, cursor)
+                        failures = 0
+                        continue
+                    self._closed.wait(backoff)
+                    backoff = min(2 * backoff, self._max_backoff)
+                    break
+                failures = 0
+                self._spool.commit(cursor)
+            else:
+                backoff = 1
+
+    def _bury(self, data, cursor):
+        # Moves an undeliverable record to the dead file, one per line
+        print("Moving a spooled message to {}".format(self._dead),
+              file=sys.stderr)
+        try:
+            with open(self._dead, "ab") as f:
+                f.write(data + b"\n")
+        except OSError:
+            traceback.print_exc()
+        self._spool.commit(cursor)
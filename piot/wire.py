@@ -0,0 +1,285 @@
+from array import array
+from collections import OrderedDict
+import struct
+import sys
+import zlib
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from .core import Frame, LineEncoder
+
+
+__all__ = ["BinaryEncoder", "BinaryDecoder", "get_encoder", "main"]
+
+
+# Every block is self-contained: a header, then schema and data records whose
+# schema ids and timestamp deltas start over in each block
+_MAGIC = b"PB"
+_VERSION = 1
+_COMPRESSION = {None: 0, "zlib": 1, "zstd": 2}
+_SCHEMA, _DATA = 1, 2
+_F64, _F32 = struct.Struct("<d"), struct.Struct("<f")
+
+
+def _put_varint(buf, n):
+    while n > 0x7F:
+        buf.append(n & 0x7F | 0x80)
+        n >>= 7
+    buf.append(n)
+
+
+def _put_zigzag(buf, n):
+    _put_varint(buf, n << 1 if n >= 0 else (-n << 1) - 1)
+
+
+def _put_str(buf, s):
+    data = str(s).encode("utf-8")
+    _put_varint(buf, len(data))
+    buf += data
+
+
+def _compress(data, compression, level):
+    if compression == "zlib":
+        return zlib.compress(data, level if level is not None else 6)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(
+            level=level if level is not None else 3).compress(data)
+    return data
+
+
+def _decompress(data, code):
+    if code == 1:
+        return zlib.decompress(data)
+    if code == 2:
+        if zstandard is None:
+            raise ValueError("zstandard is required to decode this block")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+class BinaryEncoder:
+    # Encodes batches of samples as (timestamp, measurement, tags, fields)
+    # into compact blocks: a schema record per distinct measurement, tag set
+    # and field set, varint timestamp deltas and packed values
+    def __init__(self, compression=None, level=None, float32=False):
+        if compression not in _COMPRESSION:
+            raise ValueError("Invalid compression: {}".format(compression))
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstandard is required for zstd compression")
+        self._compression = compression
+        self._level = level
+        self._float = b"f" if float32 else b"d"
+
+    def _type(self, v):
+        t = type(v)
+        if t is float:
+            return self._float
+        if t is int:
+            return b"i"
+        if t is bool:
+            return b"b"
+        if t is Frame:
+            return b"F"
+        return b"s"
+
+    def encode_batch(self, samples):
+        buf = bytearray()
+        schemas = {}
+        prev_ts = 0
+        for ts, measurement, tags, fields in samples:
+            types = b"".join([self._type(v) for v in fields.values()])
+            key = (measurement, tuple(tags.items()), tuple(fields), types)
+            schema_id = schemas.get(key)
+            if schema_id is None:
+                schema_id = schemas[key] = len(schemas)
+                buf.append(_SCHEMA)
+                _put_varint(buf, schema_id)
+                _put_str(buf, measurement)
+                _put_varint(buf, len(tags))
+                for k, v in tags.items():
+                    _put_str(buf, k)
+                    _put_str(buf, v)
+                _put_varint(buf, len(fields))
+                for k, t in zip(fields, types):
+                    _put_str(buf, k)
+                    buf.append(t)
+            buf.append(_DATA)
+            _put_varint(buf, schema_id)
+            _put_zigzag(buf, ts - prev_ts)
+            prev_ts = ts
+            for v, t in zip(fields.values(), types):
+                if t == 0x64:  # d
+                    buf += _F64.pack(v)
+                elif t == 0x66:  # f
+                    buf += _F32.pack(v)
+                elif t == 0x69:  # i
+                    _put_zigzag(buf, v)
+                elif t == 0x62:  # b
+                    buf.append(1 if v else 0)
+                elif t == 0x46:  # F
+                    _put_varint(buf, len(v.shape))
+                    for n in v.shape:
+                        _put_varint(buf, n)
+                    buf += v.tobytes()
+                else:
+                    _put_str(buf, v)
+        payload = _compress(bytes(buf), self._compression, self._level)
+        header = bytearray(_MAGIC)
+        header.append(_VERSION)
+        header.append(_COMPRESSION[self._compression])
+        _put_varint(header, len(payload))
+        return bytes(header) + payload
+
+    def encode(self, timestamp, measurement, tags, fields):
+        return self.encode_batch([(timestamp, measurement, tags, fields)])
+
+
+class _Reader:
+    __slots__ = ("data", "pos")
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def byte(self):
+        self.pos += 1
+        return self.data[self.pos - 1]
+
+    def bytes(self, n):
+        self.pos += n
+        if self.pos > len(self.data):
+            raise ValueError("Truncated record")
+        return self.data[self.pos - n:self.pos]
+
+    def varint(self):
+        n = shift = 0
+        while True:
+            b = self.byte()
+            n |= (b & 0x7F) << shift
+            if b < 0x80:
+                return n
+            shift += 7
+
+    def zigzag(self):
+        n = self.varint()
+        return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+    def str(self):
+        return self.bytes(self.varint()).decode("utf-8")
+
+
+class BinaryDecoder:
+    # Decodes concatenated blocks back into samples as (timestamp,
+    # measurement, tags, fields)
+    def decode(self, data):
+        reader = _Reader(data)
+        while reader.pos < len(data):
+            if reader.bytes(2) != _MAGIC:
+                raise ValueError("Invalid block at {}".format(reader.pos - 2))
+            version, code = reader.byte(), reader.byte()
+            if version != _VERSION:
+                raise ValueError("Unsupported version: {}".format(version))
+            payload = _decompress(reader.bytes(reader.varint()), code)
+            yield from self.decode_block(payload)
+
+    def decode_file(self, f, chunk_size=1 << 16):
+        # Reads the blocks one after the other, without loading the whole file
+        data = b""
+        while True:
+            chunk = f.read(chunk_size)
+            data += chunk
+            end = self._complete(data)
+            if end:
+                yield from self.decode(data[:end])
+                data = data[end:]
+            if not chunk:
+                if data:
+                    raise ValueError("Truncated block")
+                return
+
+    def _complete(self, data):
+        # Length of the complete blocks at the start of data
+        end = 0
+        while True:
+            reader = _Reader(data)
+            reader.pos = end + 4
+            try:
+                size = reader.varint()
+            except IndexError:
+                return end
+            if reader.pos + size > len(data):
+                return end
+            end = reader.pos + size
+
+    def decode_block(self, payload):
+        reader = _Reader(payload)
+        schemas = {}
+        ts = 0
+        while reader.pos < len(payload):
+            kind = reader.byte()
+            if kind == _SCHEMA:
+                schema_id = reader.varint()
+                measurement = reader.str()
+                tags = OrderedDict(
+                    [(reader.str(), reader.str())
+                     for _ in range(reader.varint())])
+                fields = [(reader.str(), reader.byte())
+                          for _ in range(reader.varint())]
+                schemas[schema_id] = (measurement, tags, fields)
+            elif kind == _DATA:
+                measurement, tags, fields = schemas[reader.varint()]
+                ts += reader.zigzag()
+                values = OrderedDict()
+                for k, t in fields:
+                    values[k] = self._value(reader, t)
+                yield ts, measurement, OrderedDict(tags), values
+            else:
+                raise ValueError("Invalid record type: {}".format(kind))
+
+    def _value(self, reader, t):
+        if t == 0x64:  # d
+            return _F64.unpack(reader.bytes(8))[0]
+        if t == 0x66:  # f
+            # Shortest repr that survives the round trip through float32
+            return float("{:.7g}".format(_F32.unpack(reader.bytes(4))[0]))
+        if t == 0x69:  # i
+            return reader.zigzag()
+        if t == 0x62:  # b
+            return bool(reader.byte())
+        if t == 0x46:  # F
+            shape = tuple(reader.varint() for _ in range(reader.varint()))
+            n = 1
+            for d in shape:
+                n *= d
+            data = array("f", reader.bytes(4 * n))
+            if sys.byteorder != "little":
+                data.byteswap()
+            return Frame(data, shape)
+        return reader.str()
+
+
+def get_encoder(format="line", compression=None, float32=False):
+    # Encoder for the outputs, both with an encode_batch of samples as
+    # (timestamp, measurement, tags, fields); line protocol is never compressed
+    if format == "line":
+        return LineEncoder()
+    if format == "binary":
+        return BinaryEncoder(compression, float32=float32)
+    raise ValueError("Invalid format: {}".format(format))
+
+
+def main(args=None):
+    # Converts binary files (or stdin) back to line protocol
+    args = sys.argv[1:] if args is None else args
+    decoder, encoder = BinaryDecoder(), LineEncoder()
+    for name in args or ["-"]:
+        f = sys.stdin.buffer if name == "-" else open(name, "rb")
+        with f:
+            for sample in decoder.decode_file(f):
+                print(encoder.encode(*sample))
+
+
+if __name__ == "__main__":
+    main()